@@ -0,0 +1,481 @@
+# bench.py
+"""
+Offline load test for the bot.
+
+Imports main.py's dispatcher and feeds it synthetic updates, with the Bot API
+and Google Sheets replaced by in-process fakes (configurable latency and
+HTTP 429 injection). Needs no network and no credentials; every run uses a
+fresh temporary database and a fixed random seed, so numbers are comparable
+between runs on the same machine.
+
+Scenarios:
+- register: a burst of users sending "nick pubg_id" in the registration state
+- leaderboard: /reyting plus ◀️/▶️ page presses against a seeded tournament
+- receipts: a flood of payment photos into handle_check (10% re-sent duplicates)
+- cards: a leaderboard storm answered with image cards, with standings changing
+  mid-storm; reports card renders, render latency and the file_id cache hit rate
+
+Usage:
+    python bench.py                      # all scenarios, default sizes
+    python bench.py -s leaderboard -n 20000 --concurrency 200
+    python bench.py --tg-latency 0.05 --tg-429 0.01 --json
+"""
+
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+BOT_ID = 123456
+ADMIN_IDS = (900001, 900002, 900003)
+
+
+class RateLimited(Exception):
+    """
+    Mimics gspread's APIError closely enough for sheet_sync.is_rate_limited().
+    """
+
+    class _Response:
+        status_code = 429
+
+    response = _Response()
+
+
+class FakeWorksheet:
+    """
+    In-memory stand-in for a gspread Worksheet. Methods block (time.sleep) like
+    the real client, so they exercise the SheetsGateway thread pool.
+    """
+
+    def __init__(self, latency: float, error_rate: float, seed: int):
+        self.rows: List[List[Any]] = [["Nickname", "PUBG ID", "User ID", "Registration ID"]]
+        self.latency = latency
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self.spreadsheet = self
+        self.calls = 0
+
+    def _call(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self._rng.uniform(0.5, 1.5) * self.latency)
+        if self._rng.random() < self.error_rate:
+            raise RateLimited("429: Quota exceeded")
+
+    def get_all_values(self):
+        self._call()
+        return [[str(v) for v in row] for row in self.rows]
+
+    def append_rows(self, rows):
+        self._call()
+        first = len(self.rows) + 1
+        self.rows.extend(list(r) for r in rows)
+        return {"updates": {"updatedRange": f"'Reyting-bot'!A{first}:D{len(self.rows)}"}}
+
+    def append_row(self, row):
+        return self.append_rows([row])
+
+    def batch_update(self, data):
+        self._call()
+        for item in data:
+            row = int(item["range"].split(":")[0][1:])
+            self.rows[row - 1] = list(item["values"][0])
+
+    def get(self, a1):
+        self._call()
+        return self.get_all_values()[1:]
+
+    def values_get(self, a1):
+        return {"values": self.get(a1)}
+
+
+def make_fake_session(bot, middleware, latency: float, error_rate: float, retry_after: int, seed: int):
+    """
+    A BaseSession that answers every Bot API method locally. The real session's
+    middleware manager is kept, so OutboundScheduler and metrics still run.
+    """
+    from aiogram.client.session.base import BaseSession
+    from aiogram.exceptions import TelegramRetryAfter
+    from aiogram.methods import EditMessageMedia, GetChatMember, GetFile, GetMe
+    from aiogram.types import ChatMemberMember, File, Message, MessageId, User
+
+    class FakeSession(BaseSession):
+        def __init__(self):
+            super().__init__()
+            self.middleware = middleware
+            self.rng = random.Random(seed)
+            self.message_ids = itertools.count(1)
+            self.calls: Dict[str, int] = {}
+            self.limited = 0
+            self.uploads = 0
+            self.uploaded_bytes = 0
+
+        async def make_request(self, bot, method, timeout=None):
+            name = method.__api_method__
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if latency:
+                await asyncio.sleep(self.rng.uniform(0.5, 1.5) * latency)
+            if name.startswith(("send", "copy", "edit")) and self.rng.random() < error_rate:
+                self.limited += 1
+                raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=retry_after)
+            if isinstance(method, GetMe):
+                return User(id=BOT_ID, is_bot=True, first_name="Bench", username="bench_bot")
+            if isinstance(method, GetFile):
+                return File(file_id=method.file_id, file_unique_id=f"u-{method.file_id}",
+                            file_path=f"photos/{method.file_id}.jpg")
+            if isinstance(method, GetChatMember):
+                return ChatMemberMember(user=User(id=method.user_id, is_bot=False, first_name="U"))
+            returning = getattr(method, "__returning__", None)
+            if returning is Message or isinstance(method, EditMessageMedia):
+                chat_id = getattr(method, "chat_id", 0)
+                message = {
+                    "message_id": next(self.message_ids), "date": int(time.time()),
+                    "chat": {"id": chat_id if isinstance(chat_id, int) else 0, "type": "private"},
+                }
+                photo = method.media.media if isinstance(method, EditMessageMedia) else getattr(method, "photo", None)
+                if photo is None:
+                    message["text"] = getattr(method, "text", None) or ""
+                else:
+                    if not isinstance(photo, str):  # an upload: Telegram assigns a file_id
+                        self.uploads += 1
+                        self.uploaded_bytes += len(photo.data)
+                        photo = f"card-{self.uploads}"
+                    message["photo"] = [{"file_id": photo, "file_unique_id": f"u-{photo}", "width": 900, "height": 1000}]
+                return Message.model_validate(message, context={"bot": bot})
+            if returning is MessageId:
+                return MessageId(message_id=next(self.message_ids))
+            return True
+
+        async def close(self):
+            pass
+
+        async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+            yield fake_receipt_image(url)
+
+    return FakeSession()
+
+
+def fake_receipt_image(key: str) -> bytes:
+    """
+    A small JPEG that differs per `key` (b"" without Pillow: receipts are then only matched by file id).
+    """
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        return b""
+    rng = random.Random(key)
+    img = Image.new("L", (320, 560), 255)
+    draw = ImageDraw.Draw(img)
+    for _ in range(25):
+        x, y = rng.randrange(280), rng.randrange(520)
+        draw.rectangle((x, y, x + rng.randrange(10, 120), y + rng.randrange(5, 40)), fill=rng.randrange(200))
+    out = io.BytesIO()
+    img.save(out, "JPEG", quality=80)
+    return out.getvalue()
+
+
+# ----------------------------
+# synthetic updates
+# ----------------------------
+_update_ids = itertools.count(1)
+
+
+def _user(uid: int) -> dict:
+    return {"id": uid, "is_bot": False, "first_name": f"U{uid}", "username": f"u{uid}"}
+
+
+def message_update(uid: int, text: str = None, photo: bool = False, file_key: str = None) -> dict:
+    message = {"message_id": next(_update_ids), "date": int(time.time()),
+               "chat": {"id": uid, "type": "private"}, "from": _user(uid)}
+    if photo:
+        key = file_key or str(uid)
+        message["photo"] = [{"file_id": f"photo-{key}", "file_unique_id": f"u-photo-{key}", "width": 800, "height": 600}]
+    else:
+        message["text"] = text
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": next(_update_ids), "message": message}
+
+
+def callback_update(uid: int, data: str, photo: bool = False) -> dict:
+    message = {"message_id": 1, "date": int(time.time()), "chat": {"id": uid, "type": "private"},
+               "from": {"id": BOT_ID, "is_bot": True, "first_name": "Bench"}}
+    if photo:  # pressed under a leaderboard card
+        message["photo"] = [{"file_id": "card-0", "file_unique_id": "u-card-0", "width": 900, "height": 1000}]
+        message["caption"] = "🏆 Reyting"
+    else:
+        message["text"] = "🏆 Reyting"
+    return {"update_id": next(_update_ids), "callback_query": {
+        "id": str(next(_update_ids)), "from": _user(uid), "chat_instance": "bench", "data": data,
+        "message": message,
+    }}
+
+
+# ----------------------------
+# runner
+# ----------------------------
+_background: List[asyncio.Task] = []  # scenario side tasks, awaited after the updates
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def feed(main, updates: List[dict], concurrency: int, trace_memory: bool) -> Dict[str, Any]:
+    from aiogram.types import Update
+
+    parsed = [Update.model_validate(u, context={"bot": main.bot}) for u in updates]
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(update):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await main.dp.feed_update(main.bot, update)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(one(u) for u in parsed))
+    elapsed = time.perf_counter() - started
+    peak = 0
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    latencies.sort()
+    result = {
+        "updates": len(parsed),
+        "seconds": round(elapsed, 3),
+        "updates_per_s": round(len(parsed) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        "errors": errors,
+    }
+    if trace_memory:
+        result["peak_traced_kb"] = peak // 1024
+    return result
+
+
+async def drain_sheet_sync(main, timeout: float = 120.0) -> float:
+    """
+    Seconds until SheetSync has mirrored every new registration (-1 on timeout).
+    """
+    started = time.perf_counter()
+    while main.registrations.dirty_count():
+        if time.perf_counter() - started > timeout:
+            return -1.0
+        await asyncio.sleep(0.05)
+    return round(time.perf_counter() - started, 3)
+
+
+async def _set_state(main, uid: int, state):
+    from aiogram.fsm.storage.base import StorageKey
+    await main.dp.storage.set_state(StorageKey(bot_id=main.bot.id, chat_id=uid, user_id=uid), state)
+
+
+async def scenario_register(main, n: int, rng: random.Random) -> List[dict]:
+    users = range(1_000_000, 1_000_000 + n)
+    for uid in users:
+        await _set_state(main, uid, main.RegistrationState.waiting_for_pubg_nick)
+    return [message_update(uid, f"Player{uid} {5_000_000_000 + uid}") for uid in users]
+
+
+def _seed_tournament(main, rng: random.Random, players: int = 5000, matches: int = 10):
+    from matches import ResultRow
+
+    for i in range(players):
+        main.registrations.add(2_000_000 + i, f"Seed{i}", str(7_000_000_000 + i))
+    for match in range(matches):
+        rows = [ResultRow(str(7_000_000_000 + i), rng.randint(0, 12), rng.randint(1, 100), "")
+                for i in rng.sample(range(players), 100)]
+        main.matches.import_match(f"bench-{match}", rows)
+    main.rebuild_standings()
+
+
+async def scenario_leaderboard(main, n: int, rng: random.Random) -> List[dict]:
+    players = 5000
+    _seed_tournament(main, rng, players)
+    pages = players // main.LEADERBOARD_PAGE_SIZE
+    updates = []
+    for i in range(n):
+        uid = 2_000_000 + rng.randrange(players * 2)  # half of them are registered
+        if i % 3 == 0:
+            updates.append(message_update(uid, "/reyting"))
+        else:
+            updates.append(callback_update(uid, f"lb:{rng.randrange(pages)}"))
+    return updates
+
+
+async def scenario_cards(main, n: int, rng: random.Random) -> List[dict]:
+    from matches import ResultRow
+
+    players = 5000
+    if not len(main.standings):
+        _seed_tournament(main, rng, players)
+    pages = players // main.LEADERBOARD_PAGE_SIZE
+    hot = min(pages, 10)  # a storm is mostly the first pages and "my place"
+    updates = []
+    for i in range(n):
+        uid = 2_000_000 + rng.randrange(players * 2)
+        if i % 3 == 0:
+            updates.append(message_update(uid, "/reyting"))
+        elif i % 3 == 1:
+            updates.append(callback_update(uid, f"lb:{rng.randrange(hot)}", photo=True))
+        else:
+            updates.append(callback_update(uid, rng.choice(("lb:me", f"lb:{rng.randrange(pages)}")), photo=True))
+
+    async def new_match():
+        # results land mid-storm: only pages whose rows changed get new cards
+        await asyncio.sleep(0.5)
+        main.matches.import_match("bench-live", [ResultRow(str(7_000_000_000 + i), 15, 1, "") for i in range(5)])
+        main.rebuild_standings()
+
+    _background.append(asyncio.create_task(new_match()))
+    return updates
+
+
+async def scenario_receipts(main, n: int, rng: random.Random) -> List[dict]:
+    users = range(3_000_000, 3_000_000 + n)
+    for uid in users:
+        await _set_state(main, uid, main.RegistrationState.waiting_for_payment_check)
+    # every tenth receipt re-sends an earlier user's file, which is rejected without reaching an admin
+    return [message_update(uid, photo=True, file_key=str(rng.randrange(3_000_000, uid)) if i % 10 == 9 else None)
+            for i, uid in enumerate(users)]
+
+
+SCENARIOS: Dict[str, Callable] = {
+    "register": scenario_register,
+    "leaderboard": scenario_leaderboard,
+    "receipts": scenario_receipts,
+    "cards": scenario_cards,
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test with fake Telegram and fake Sheets.")
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="scenario to run (repeatable; default: all)")
+    parser.add_argument("-n", "--updates", type=int, default=5000, help="updates per scenario")
+    parser.add_argument("--concurrency", type=int, default=100, help="updates processed at once")
+    parser.add_argument("--tg-latency", type=float, default=0.02, help="mean Bot API latency, seconds")
+    parser.add_argument("--tg-429", type=float, default=0.0, help="share of sends answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after of injected 429s")
+    parser.add_argument("--sheets-latency", type=float, default=0.2, help="mean Sheets call latency, seconds")
+    parser.add_argument("--sheets-429", type=float, default=0.0, help="share of Sheets calls failing with 429")
+    parser.add_argument("--global-rate", type=float, default=1000.0,
+                        help="outbound global msg/s (30 in production; high to measure the bot itself)")
+    parser.add_argument("--chat-rate", type=float, default=1000.0, help="outbound per-chat msg/s")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--tracemalloc", action="store_true", help="report traced peak memory (slower)")
+    parser.add_argument("--json", action="store_true", help="print one JSON object instead of a table")
+    return parser.parse_args(argv)
+
+
+def configure_env(args, workdir: str):
+    # main.py reads its configuration at import time
+    os.environ.update({
+        "BOT_TOKEN": f"{BOT_ID}:BENCHMARK-TOKEN",
+        "ADMIN_ID": ",".join(map(str, ADMIN_IDS)),
+        "DB_PATH": os.path.join(workdir, "bench.db"),
+        "BOT_MODE": "polling",
+        "OUTBOUND_GLOBAL_RATE": str(args.global_rate),
+        "OUTBOUND_CHAT_RATE": str(args.chat_rate),
+        "OUTBOUND_CHAT_BURST": "1000",
+        "THROTTLE_RATE": "1000",
+        "THROTTLE_BURST": "1000",
+        "SHEET_WRITE_WINDOW": "0.5",
+        "METRICS_PORT": "0",
+    })
+
+
+async def run(args) -> Dict[str, Any]:
+    import logging
+    import main
+
+    logging.getLogger().setLevel(logging.ERROR)  # injected 429s would otherwise flood the output
+    main.create_bot(os.environ["BOT_TOKEN"])
+    worksheet = FakeWorksheet(args.sheets_latency, args.sheets_429, args.seed)
+    main.sheets._connect = lambda: worksheet
+    session = make_fake_session(main.bot, main.bot.session.middleware, args.tg_latency, args.tg_429,
+                                args.retry_after, args.seed)
+    main.bot.session = session
+
+    rng = random.Random(args.seed)
+    results: Dict[str, Any] = {}
+    await main.dp.emit_startup(bot=main.bot)
+    renderer = main.card_renderer
+    try:
+        for name in args.scenario or list(SCENARIOS):
+            # image cards only in their own scenario, so the others keep measuring the text pages
+            main.card_renderer = renderer if name == "cards" else None
+            updates = await SCENARIOS[name](main, args.updates, rng)
+            results[name] = await feed(main, updates, args.concurrency, args.tracemalloc)
+            await asyncio.gather(*_background)
+            _background.clear()
+            if name == "register":
+                results[name]["sheet_drain_s"] = await drain_sheet_sync(main)
+            if name == "cards" and renderer is not None:
+                results[name]["cards"] = dict(renderer.stats(), uploads=session.uploads,
+                                              uploaded_kb=session.uploaded_bytes // 1024)
+            results[name]["handlers"] = main.metrics.summary("handler") + main.metrics.summary("cards")
+            main.metrics.series.clear()
+    finally:
+        main.card_renderer = renderer
+        await main.dp.emit_shutdown(bot=main.bot)
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "args": {k: v for k, v in vars(args).items() if k != "json"},
+        "scenarios": results,
+        "sheets_calls": worksheet.calls,
+        "bot_api_calls": session.calls,
+        "injected_429": session.limited,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="bot-bench-") as workdir:
+        configure_env(args, workdir)
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False))
+        return
+    print(f"python {report['python']} ({report['machine']}), seed {args.seed}, concurrency {args.concurrency}, "
+          f"tg latency {args.tg_latency}s, sheets latency {args.sheets_latency}s")
+    print(f"{'scenario':<12} {'updates':>8} {'upd/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>6}")
+    for name, r in report["scenarios"].items():
+        print(f"{name:<12} {r['updates']:>8} {r['updates_per_s']:>9} {r['p50_ms']:>8} {r['p99_ms']:>8} "
+              f"{r['max_ms']:>8} {r['errors']:>6}" + (f"  peak {r['peak_traced_kb']} KiB" if "peak_traced_kb" in r else "")
+              + (f"  sheet drained in {r['sheet_drain_s']}s" if "sheet_drain_s" in r else ""))
+        if "cards" in r:
+            print("    cards: " + ", ".join(f"{k}={v}" for k, v in r["cards"].items()))
+        for line in r["handlers"]:
+            print(f"    {line}")
+    print(f"Bot API calls: {sum(report['bot_api_calls'].values())} ({report['injected_429']} injected 429), "
+          f"Sheets calls: {report['sheets_calls']}, peak RSS: {report['peak_rss_kb'] // 1024} MiB")
+
+
+if __name__ == "__main__":
+    main_cli()
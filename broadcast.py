@@ -0,0 +1,180 @@
+# broadcast.py
+"""
+Broadcast engine for tournament announcements.
+
+A broadcast is a job with one recipient row per user in SQLite. Workers send
+concurrently at BULK priority, so OutboundScheduler keeps them within flood
+limits and interactive replies still go first. Recipient status is
+checkpointed in small batches, and jobs still running at shutdown resume on
+the next start. At worst the last unsaved batch is sent twice. Users who
+blocked the bot are remembered and skipped by later broadcasts.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramForbiddenError
+
+import db
+import outbound
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+BLOCKED = "blocked"
+
+CHECKPOINT_EVERY = 50  # recipients per status write
+
+
+class BroadcastEngine:
+    def __init__(self, bot: Bot, db_path: str, concurrency: int = 20):
+        self.bot = bot
+        self.concurrency = concurrency
+        self._conn = db.connect(db_path)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS broadcast_jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " admin_chat_id INTEGER NOT NULL,"
+            " text TEXT,"
+            " from_chat_id INTEGER,"
+            " message_id INTEGER,"
+            " status TEXT NOT NULL DEFAULT 'running',"
+            " created_at REAL NOT NULL,"
+            " finished_at REAL);"
+            "CREATE TABLE IF NOT EXISTS broadcast_recipients ("
+            " job_id INTEGER NOT NULL,"
+            " user_id INTEGER NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            " PRIMARY KEY (job_id, user_id));"
+            "CREATE TABLE IF NOT EXISTS blocked_users ("
+            " user_id INTEGER PRIMARY KEY,"
+            " blocked_at REAL NOT NULL);"
+        )
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def create(self, admin_chat_id: int, user_ids: Iterable[int], text: Optional[str] = None,
+               from_chat_id: Optional[int] = None, message_id: Optional[int] = None) -> Tuple[int, int]:
+        """
+        Creates a job that sends `text`, or copies message `message_id` from
+        `from_chat_id`. Returns (job_id, recipient count); blocked users are left out.
+        """
+        blocked = {row[0] for row in self._conn.execute("SELECT user_id FROM blocked_users")}
+        recipients = sorted({uid for uid in user_ids if uid not in blocked})
+        with self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO broadcast_jobs (admin_chat_id, text, from_chat_id, message_id, created_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (admin_chat_id, text, from_chat_id, message_id, time.time()),
+            )
+            job_id = cur.lastrowid
+            self._conn.executemany(
+                "INSERT INTO broadcast_recipients (job_id, user_id) VALUES (?, ?)",
+                [(job_id, uid) for uid in recipients],
+            )
+        return job_id, len(recipients)
+
+    def start(self, job_id: int):
+        if job_id not in self._tasks:
+            task = asyncio.create_task(self._run(job_id))
+            self._tasks[job_id] = task
+            task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    def resume(self):
+        """
+        Restarts jobs that were interrupted (crash or redeploy).
+        """
+        for (job_id,) in self._conn.execute("SELECT id FROM broadcast_jobs WHERE status = 'running'").fetchall():
+            logger.info("Broadcast #%d: resuming", job_id)
+            self.start(job_id)
+
+    async def stop(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._conn.close()
+
+    def progress(self, job_id: int) -> Dict[str, int]:
+        counts = {PENDING: 0, SENT: 0, FAILED: 0, BLOCKED: 0}
+        for status, count in self._conn.execute(
+                "SELECT status, COUNT(*) FROM broadcast_recipients WHERE job_id = ? GROUP BY status", (job_id,)):
+            counts[status] = count
+        return counts
+
+    async def _send(self, job: tuple, user_id: int) -> str:
+        _, text, from_chat_id, message_id = job
+        try:
+            with outbound.priority(outbound.BULK):
+                if message_id is not None:
+                    await self.bot.copy_message(user_id, from_chat_id, message_id)
+                else:
+                    await self.bot.send_message(user_id, text)
+            return SENT
+        except TelegramForbiddenError:
+            return BLOCKED
+        except TelegramBadRequest as e:
+            logger.info("Broadcast to %s failed: %s", user_id, e)
+            return FAILED
+        except TelegramAPIError as e:
+            logger.warning("Broadcast to %s failed: %s", user_id, e)
+            return FAILED
+
+    async def _run(self, job_id: int):
+        job = self._conn.execute(
+            "SELECT admin_chat_id, text, from_chat_id, message_id FROM broadcast_jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        pending = [row[0] for row in self._conn.execute(
+            "SELECT user_id FROM broadcast_recipients WHERE job_id = ? AND status = 'pending' ORDER BY user_id",
+            (job_id,))]
+        queue: "asyncio.Queue[int]" = asyncio.Queue()
+        for uid in pending:
+            queue.put_nowait(uid)
+        results: List[Tuple[str, int, int]] = []
+        started = time.monotonic()
+
+        def checkpoint():
+            if not results:
+                return
+            with self._conn:
+                self._conn.executemany(
+                    "UPDATE broadcast_recipients SET status = ? WHERE job_id = ? AND user_id = ?", results)
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO blocked_users (user_id, blocked_at) VALUES (?, ?)",
+                    [(uid, time.time()) for status, _, uid in results if status == BLOCKED])
+            results.clear()
+
+        async def worker():
+            while True:
+                try:
+                    uid = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                results.append((await self._send(job, uid), job_id, uid))
+                if len(results) >= CHECKPOINT_EVERY:
+                    checkpoint()
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        finally:
+            checkpoint()
+        elapsed = time.monotonic() - started
+        with self._conn:
+            self._conn.execute("UPDATE broadcast_jobs SET status = 'done', finished_at = ? WHERE id = ?",
+                               (time.time(), job_id))
+        counts = self.progress(job_id)
+        rate = len(pending) / elapsed if elapsed > 0 else 0.0
+        logger.info("Broadcast #%d done: %s in %.1fs", job_id, counts, elapsed)
+        report = (f"📣 Xabar #{job_id} yakunlandi.\n"
+                  f"✅ Yuborildi: {counts[SENT]}\n"
+                  f"🚫 Bloklagan: {counts[BLOCKED]}\n"
+                  f"⚠️ Xatolik: {counts[FAILED]}\n"
+                  f"⏱ {elapsed:.1f} s, {rate:.1f} xabar/s")
+        try:
+            with outbound.priority(outbound.NOTIFICATION):
+                await self.bot.send_message(job[0], report)
+        except TelegramAPIError as e:
+            logger.warning("Broadcast #%d report not delivered: %s", job_id, e)
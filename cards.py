@@ -0,0 +1,240 @@
+# cards.py
+"""
+Leaderboard image cards.
+
+Rendering a PNG takes tens of milliseconds of pure CPU, so it never runs on
+the event loop: `render_card` is a plain function executed in a
+ProcessPoolExecutor (separate processes, so renders don't compete with the
+bot for the GIL).
+
+Cards are content-addressed: the key is a hash of exactly what is drawn
+(title, rows, footer, CARD_STYLE). Once a card has been sent, Telegram's
+`file_id` for it is stored under that key, so every later request for the
+same standings is a plain `send_photo(file_id)` with no render and no upload.
+Concurrent requests for a card that is not cached yet share one render and
+one upload (single-flight), and at most `max_pending` different cards are
+queued for rendering at once. Past that `deliver` declines, so a new
+leaderboard is answered with text instead of waiting behind the queue; with
+`wait` (paging an existing card) it waits up to that many seconds for a
+render slot first. Keys and file_ids are kept in SQLite, so the cache
+survives restarts while the standings are unchanged.
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable, Dict, Optional, Sequence, Tuple, Union
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile
+
+import db
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:  # optional: without Pillow the leaderboard stays text-only
+    Image = None
+
+# bump when the drawing changes, so cached file_ids of the old look are not reused
+CARD_STYLE = 1
+
+# (rank, nickname, pubg_id, points, kills, wins)
+CardRow = Tuple[int, str, str, int, int, int]
+
+_FONT_CANDIDATES = (
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+)
+_WIDTH = 900
+_ROW_HEIGHT = 44
+_TOP = 120
+_MEDALS = {1: (255, 196, 0), 2: (192, 192, 192), 3: (205, 127, 50)}
+
+_fonts: Dict[Tuple[str, int], object] = {}
+
+
+def available() -> bool:
+    return Image is not None
+
+
+def _font(path: str, size: int):
+    key = (path, size)
+    if key not in _fonts:
+        font = None
+        for candidate in ((path,) if path else ()) + _FONT_CANDIDATES:
+            if candidate and os.path.exists(candidate):
+                font = ImageFont.truetype(candidate, size)
+                break
+        _fonts[key] = font or ImageFont.load_default(size=size)
+    return _fonts[key]
+
+
+def card_key(title: str, rows: Sequence[CardRow], footer: str) -> str:
+    payload = json.dumps([CARD_STYLE, title, list(rows), footer], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def render_card(title: str, rows: Sequence[CardRow], footer: str, font_path: str = "") -> bytes:
+    """
+    Draws one leaderboard page as PNG. Runs in a worker process.
+    """
+    height = _TOP + _ROW_HEIGHT * max(1, len(rows)) + 70
+    img = Image.new("RGB", (_WIDTH, height), (22, 27, 34))
+    draw = ImageDraw.Draw(img)
+    title_font, head_font, row_font = _font(font_path, 40), _font(font_path, 20), _font(font_path, 24)
+    draw.text((40, 28), title, font=title_font, fill=(255, 255, 255))
+    columns = ((40, "#"), (110, "O‘yinchi"), (520, "Ochko"), (650, "Kill"), (770, "G‘alaba"))
+    for x, label in columns:
+        draw.text((x, _TOP - 34), label, font=head_font, fill=(139, 148, 158))
+    for i, (rank, nickname, pubg_id, points, kills, wins) in enumerate(rows):
+        y = _TOP + i * _ROW_HEIGHT
+        if i % 2 == 0:
+            draw.rectangle((24, y - 4, _WIDTH - 24, y + _ROW_HEIGHT - 8), fill=(33, 38, 45))
+        color = _MEDALS.get(rank, (230, 237, 243))
+        if len(nickname) > 24:
+            nickname = nickname[:23] + "…"
+        for (x, _), value in zip(columns, (rank, nickname, points, kills, wins)):
+            draw.text((x, y), str(value), font=row_font, fill=color)
+    draw.text((40, height - 48), footer, font=head_font, fill=(139, 148, 158))
+    out = io.BytesIO()
+    # a 32-colour palette is plenty for flat colours and anti-aliased text: ~3x smaller and faster to encode than RGB
+    img.quantize(colors=32, method=Image.Quantize.FASTOCTREE).save(out, "PNG")
+    return out.getvalue()
+
+
+def _noop() -> None:
+    return None
+
+
+class CardRenderer:
+    def __init__(self, db_path: str, max_workers: int = 2, font_path: str = "", cache_size: int = 2000,
+                 max_pending: int = 0, metrics=None):
+        self.font_path = font_path
+        self.max_pending = max_pending or max_workers * 4
+        self._metrics = metrics  # optional metrics.Metrics; renders are timed as ("cards", "render")
+        self.cache_size = cache_size
+        # fork: children must not re-import main.py (spawn/forkserver would); started early by start()
+        context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+        self._executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+        self._conn = db.connect(db_path)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS card_cache ("
+            " key TEXT PRIMARY KEY,"
+            " file_id TEXT NOT NULL,"
+            " created_at REAL NOT NULL);"
+        )
+        self._file_ids: "OrderedDict[str, str]" = OrderedDict(self._conn.execute(
+            "SELECT key, file_id FROM card_cache ORDER BY created_at DESC LIMIT ?", (cache_size,)).fetchall()[::-1])
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.renders = 0
+        self.declined = 0
+
+    async def start(self):
+        """
+        Forks the worker processes now (before the bot starts its own threads) instead of on the first card.
+        """
+        await asyncio.get_running_loop().run_in_executor(self._executor, _noop)
+
+    def _remember(self, key: str, file_id: str):
+        self._file_ids[key] = file_id
+        self._file_ids.move_to_end(key)
+        while len(self._file_ids) > self.cache_size:
+            self._file_ids.popitem(last=False)
+        with self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO card_cache (key, file_id, created_at) VALUES (?, ?, ?)",
+                               (key, file_id, time.time()))
+
+    def forget(self, key: str):
+        """
+        Drops a file_id Telegram no longer accepts.
+        """
+        self._file_ids.pop(key, None)
+        with self._conn:
+            self._conn.execute("DELETE FROM card_cache WHERE key = ?", (key,))
+
+    async def render(self, title: str, rows: Sequence[CardRow], footer: str) -> bytes:
+        self.renders += 1
+        call = asyncio.get_running_loop().run_in_executor(
+            self._executor, render_card, title, list(rows), footer, self.font_path)
+        if self._metrics is None:
+            return await call
+        with self._metrics.timer("cards", "render"):
+            return await call
+
+    async def deliver(self, title: str, rows: Sequence[CardRow], footer: str,
+                      send: Callable[[Union[str, BufferedInputFile]], Awaitable[Optional[str]]],
+                      wait: float = 0.0) -> bool:
+        """
+        Calls `send(photo)` with the cached file_id, or with a freshly rendered
+        PNG; `send` returns the file_id Telegram assigned (None if unknown).
+        Returns False, without calling `send`, if the render queue is full and
+        has no room within `wait` seconds.
+        """
+        key = card_key(title, rows, footer)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        while True:
+            file_id = self._file_ids.get(key)
+            if file_id is None and key in self._pending:
+                # someone is rendering/uploading this card right now: wait for its file_id
+                if not wait:
+                    file_id = await asyncio.shield(self._pending[key])
+                else:
+                    try:
+                        file_id = await asyncio.wait_for(asyncio.shield(self._pending[key]),
+                                                         max(0.0, deadline - loop.time()))
+                    except asyncio.TimeoutError:
+                        self.declined += 1
+                        return False
+            if file_id is not None:
+                self.hits += 1
+                if key in self._file_ids:
+                    self._file_ids.move_to_end(key)
+                try:
+                    await send(file_id)
+                except TelegramBadRequest as e:
+                    if "not modified" not in e.message:
+                        self.forget(key)  # e.g. "wrong file identifier": re-render next time
+                    raise
+                return True
+            if len(self._pending) < self.max_pending:
+                break
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                self.declined += 1
+                return False
+            # queue full: wait for any render in flight to finish, then look again (it may have been this card)
+            await asyncio.wait(list(self._pending.values()), timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        future = loop.create_future()
+        self._pending[key] = future
+        try:
+            png = await self.render(title, rows, footer)
+            file_id = await send(BufferedInputFile(png, filename="reyting.png"))
+            if file_id:
+                self._remember(key, file_id)
+        finally:
+            self._pending.pop(key, None)
+            if not future.done():
+                future.set_result(file_id)
+        return True
+
+    def stats(self) -> Dict[str, float]:
+        requests = self.hits + self.renders
+        return {
+            "cached_cards": len(self._file_ids),
+            "hits": self.hits,
+            "renders": self.renders,
+            "declined": self.declined,
+            "hit_rate": round(self.hits / requests, 3) if requests else 0.0,
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._conn.close()
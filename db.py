@@ -0,0 +1,19 @@
+# db.py
+"""
+Shared SQLite helpers. Every local store of the bot lives in one database file
+(DB_PATH); each component opens its own connection through `connect()`.
+"""
+
+import sqlite3
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    Opens `path` in WAL mode so readers never block the writer and commits
+    only need an fsync at checkpoints.
+    """
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
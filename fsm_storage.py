@@ -0,0 +1,158 @@
+# fsm_storage.py
+"""
+Restart-safe FSM storage for aiogram.
+
+MemoryStorage loses every pending registration on redeploy and never forgets
+idle users. SQLiteStorage keeps all records in a dict (so reads never touch the
+disk) and writes changed keys back to SQLite in WAL mode every
+`flush_interval` seconds and on shutdown. Records untouched for `ttl` seconds
+are expired. On startup the table is loaded with a single SELECT.
+
+A hard crash can lose at most the last `flush_interval` seconds of changes.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, List, Mapping, Optional, Set
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+
+import db
+
+logger = logging.getLogger(__name__)
+
+SWEEP_INTERVAL = 60.0  # seconds between scans for expired records
+
+
+class _Record:
+    __slots__ = ("state", "data", "touched")
+
+    def __init__(self, state: Optional[str] = None, data: Optional[Dict[str, Any]] = None, touched: float = 0.0):
+        self.state = state
+        self.data = data or {}
+        self.touched = touched
+
+    def is_empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+class SQLiteStorage(BaseStorage):
+    def __init__(self, path: str, ttl: float = 7 * 24 * 3600, flush_interval: float = 1.0,
+                 key_builder: Optional[KeyBuilder] = None):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._conn = db.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fsm_state ("
+            " key TEXT PRIMARY KEY,"
+            " state TEXT,"
+            " data TEXT NOT NULL,"
+            " touched REAL NOT NULL)"
+        )
+        self._records: Dict[str, _Record] = {}
+        self._dirty: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._last_sweep = time.monotonic()
+        self._load()
+
+    def _load(self):
+        started = time.perf_counter()
+        horizon = time.time() - self.ttl
+        with self._conn:
+            self._conn.execute("DELETE FROM fsm_state WHERE touched < ?", (horizon,))
+        for key, state, data, touched in self._conn.execute("SELECT key, state, data, touched FROM fsm_state"):
+            self._records[key] = _Record(state, json.loads(data), touched)
+        logger.info("FSM storage: loaded %d record(s) in %.1f ms", len(self._records),
+                    (time.perf_counter() - started) * 1000)
+
+    def _get(self, key: StorageKey) -> Optional[_Record]:
+        record = self._records.get(self.key_builder.build(key))
+        if record is not None and record.touched < time.time() - self.ttl:
+            return None
+        return record
+
+    def _touch(self, key: StorageKey) -> _Record:
+        k = self.key_builder.build(key)
+        record = self._records.get(k)
+        if record is None or record.touched < time.time() - self.ttl:
+            record = self._records[k] = _Record()
+        record.touched = time.time()
+        self._dirty.add(k)
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+        return record
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        self._touch(key).state = state.state if isinstance(state, State) else state
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = self._get(key)
+        return record.state if record else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            msg = f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            raise DataNotDictLikeError(msg)
+        self._touch(key).data = data.copy()
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = self._get(key)
+        return record.data.copy() if record else {}
+
+    def flush(self, sweep: bool = False):
+        """
+        Writes changed records to disk; with `sweep`, also drops expired ones.
+        """
+        expired: List[str] = []
+        if sweep:
+            horizon = time.time() - self.ttl
+            expired = [k for k, r in self._records.items() if r.touched < horizon]
+        upserts: List[tuple] = []
+        deletes: List[tuple] = [(k,) for k in expired]
+        for k in expired:
+            del self._records[k]
+            self._dirty.discard(k)
+        for k in self._dirty:
+            record = self._records.get(k)
+            if record is None or record.is_empty():
+                self._records.pop(k, None)
+                deletes.append((k,))
+            else:
+                upserts.append((k, record.state, json.dumps(record.data, ensure_ascii=False), record.touched))
+        self._dirty.clear()
+        if not upserts and not deletes:
+            return
+        with self._conn:
+            self._conn.executemany("DELETE FROM fsm_state WHERE key = ?", deletes)
+            self._conn.executemany(
+                "INSERT INTO fsm_state (key, state, data, touched) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET state = excluded.state, data = excluded.data, touched = excluded.touched",
+                upserts,
+            )
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            sweep = time.monotonic() - self._last_sweep >= SWEEP_INTERVAL
+            if sweep:
+                self._last_sweep = time.monotonic()
+            try:
+                self.flush(sweep=sweep)
+            except Exception:
+                logger.exception("FSM storage flush failed")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.flush(sweep=True)
+        self._conn.close()
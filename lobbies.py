@@ -0,0 +1,259 @@
+# lobbies.py
+"""
+Lobby capacity: seats, holds and a waitlist.
+
+A tournament has `lobby_count` lobbies of `lobby_size` seats. When a user
+sends a payment receipt they get a seat on hold (or a waitlist place if every
+seat is taken); the admin's approval confirms the seat. Holds that are not
+confirmed within `hold_seconds` are released, and a released seat goes to the
+head of the waitlist straight away.
+
+Free seats are a heap (lowest lobby first, so lobbies fill one after another)
+and users map to their seat in a dict, so taking and freeing a seat is
+O(log seats). Waitlist positions and hold expiry are plain scans (O(waitlist)
+and O(seats)), which stays well under a millisecond at tournament sizes.
+Like ReviewDispatcher, no method awaits: each one runs to completion on the
+event loop thread, which makes reserve/confirm/release atomic however many
+updates race for the last seat. Every change is written to SQLite in the
+same call, so seats survive restarts.
+"""
+
+import heapq
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import db
+
+HELD = "held"
+CONFIRMED = "confirmed"
+WAITLISTED = "waitlisted"
+
+
+class Seat(NamedTuple):
+    user_id: int
+    lobby: int  # 1-based
+    seat: int   # 1-based
+    status: str
+    expires_at: Optional[float]
+
+
+class Placement(NamedTuple):
+    """
+    Outcome for one user: a seat (held or confirmed) or a waitlist position.
+    """
+    status: str
+    seat: Optional[Seat]
+    position: int = 0
+
+
+class LobbyManager:
+    def __init__(self, db_path: str, tournament: str, lobby_size: int, lobby_count: int,
+                 hold_seconds: float = 1800.0):
+        self.tournament = tournament
+        self.lobby_size = lobby_size
+        self.lobby_count = lobby_count
+        self.hold_seconds = hold_seconds
+        self._conn = db.connect(db_path)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS lobby_seats ("
+            " tournament TEXT NOT NULL,"
+            " user_id INTEGER NOT NULL,"
+            " lobby INTEGER NOT NULL,"
+            " seat INTEGER NOT NULL,"
+            " status TEXT NOT NULL,"
+            " expires_at REAL,"
+            " PRIMARY KEY (tournament, user_id),"
+            " UNIQUE (tournament, lobby, seat));"
+            "CREATE TABLE IF NOT EXISTS lobby_waitlist ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " tournament TEXT NOT NULL,"
+            " user_id INTEGER NOT NULL,"
+            " approved INTEGER NOT NULL DEFAULT 0,"
+            " UNIQUE (tournament, user_id));"
+        )
+        self._seats: Dict[int, Seat] = {}
+        for user_id, lobby, seat, status, expires_at in self._conn.execute(
+                "SELECT user_id, lobby, seat, status, expires_at FROM lobby_seats WHERE tournament = ?",
+                (tournament,)):
+            self._seats[user_id] = Seat(user_id, lobby, seat, status, expires_at)
+        taken = {(s.lobby, s.seat) for s in self._seats.values()}
+        # seats above a reduced capacity stay with their users but are not handed out again
+        self._free: List[Tuple[int, int]] = [
+            (lobby, seat) for lobby in range(1, lobby_count + 1) for seat in range(1, lobby_size + 1)
+            if (lobby, seat) not in taken
+        ]
+        heapq.heapify(self._free)
+        # user_id -> receipt already approved
+        self._waitlist: "OrderedDict[int, bool]" = OrderedDict(
+            self._conn.execute("SELECT user_id, approved FROM lobby_waitlist WHERE tournament = ? ORDER BY id",
+                               (tournament,)).fetchall()
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.lobby_count > 0 and self.lobby_size > 0
+
+    @property
+    def capacity(self) -> int:
+        return self.lobby_count * self.lobby_size
+
+    def seat_of(self, user_id: int) -> Optional[Seat]:
+        return self._seats.get(user_id)
+
+    def placement(self, user_id: int) -> Optional[Placement]:
+        seat = self._seats.get(user_id)
+        if seat is not None:
+            return Placement(seat.status, seat)
+        if user_id in self._waitlist:
+            return Placement(WAITLISTED, None, self._position(user_id))
+        return None
+
+    def is_confirmed(self, user_id: int) -> bool:
+        """
+        True once the user's receipt is approved: a confirmed seat or an approved waitlist place.
+        """
+        seat = self._seats.get(user_id)
+        if seat is not None:
+            return seat.status == CONFIRMED
+        return self._waitlist.get(user_id, False)
+
+    def _position(self, user_id: int) -> int:
+        for position, queued in enumerate(self._waitlist, start=1):
+            if queued == user_id:
+                return position
+        return 0
+
+    def _save_seat(self, seat: Seat):
+        self._conn.execute(
+            "INSERT INTO lobby_seats (tournament, user_id, lobby, seat, status, expires_at) VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (tournament, user_id) DO UPDATE SET lobby = excluded.lobby, seat = excluded.seat,"
+            "  status = excluded.status, expires_at = excluded.expires_at",
+            (self.tournament, seat.user_id, seat.lobby, seat.seat, seat.status, seat.expires_at),
+        )
+        self._seats[seat.user_id] = seat
+
+    def _take_seat(self, user_id: int, status: str) -> Optional[Seat]:
+        if not self._free:
+            return None
+        lobby, number = heapq.heappop(self._free)
+        expires_at = time.time() + self.hold_seconds if status == HELD else None
+        seat = Seat(user_id, lobby, number, status, expires_at)
+        self._save_seat(seat)
+        return seat
+
+    def _dequeue(self, user_id: int):
+        self._waitlist.pop(user_id, None)
+        self._conn.execute("DELETE FROM lobby_waitlist WHERE tournament = ? AND user_id = ?",
+                           (self.tournament, user_id))
+
+    def _enqueue(self, user_id: int, approved: bool) -> Placement:
+        if user_id not in self._waitlist:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO lobby_waitlist (tournament, user_id, approved) VALUES (?, ?, ?)",
+                (self.tournament, user_id, int(approved)))
+        elif approved:
+            self._conn.execute("UPDATE lobby_waitlist SET approved = 1 WHERE tournament = ? AND user_id = ?",
+                               (self.tournament, user_id))
+        self._waitlist[user_id] = self._waitlist.get(user_id, False) or approved
+        return Placement(WAITLISTED, None, self._position(user_id))
+
+    def _free_seat(self, seat: Seat) -> List[Placement]:
+        """
+        Gives a freed seat to the head of the waitlist. Returns the promotion, if any.
+        """
+        self._seats.pop(seat.user_id, None)
+        self._conn.execute("DELETE FROM lobby_seats WHERE tournament = ? AND user_id = ?",
+                           (self.tournament, seat.user_id))
+        if seat.lobby > self.lobby_count or seat.seat > self.lobby_size:
+            return []  # capacity was reduced: this seat no longer exists
+        heapq.heappush(self._free, (seat.lobby, seat.seat))
+        if not self._waitlist:
+            return []
+        user_id, approved = next(iter(self._waitlist.items()))
+        self._dequeue(user_id)
+        promoted = self._take_seat(user_id, CONFIRMED if approved else HELD)
+        return [Placement(promoted.status, promoted)]
+
+    # ----------------------------
+    # operations (all synchronous, see module docstring)
+    # ----------------------------
+    def reserve(self, user_id: int) -> Placement:
+        """
+        Holds a seat for a submitted receipt, or queues the user. Idempotent for users who already have one.
+        """
+        current = self.placement(user_id)
+        if current is not None:
+            return current
+        with self._conn:
+            seat = self._take_seat(user_id, HELD)
+            if seat is not None:
+                return Placement(HELD, seat)
+            return self._enqueue(user_id, approved=False)
+
+    def confirm(self, user_id: int) -> Placement:
+        """
+        Receipt approved: the held seat becomes confirmed. A user whose hold has
+        lapsed gets a free seat if there is one, otherwise keeps (or takes) a
+        waitlist place and is confirmed on promotion.
+        """
+        with self._conn:
+            seat = self._seats.get(user_id)
+            if seat is not None:
+                if seat.status != CONFIRMED:
+                    seat = seat._replace(status=CONFIRMED, expires_at=None)
+                    self._save_seat(seat)
+                return Placement(CONFIRMED, seat)
+            if user_id not in self._waitlist:
+                seat = self._take_seat(user_id, CONFIRMED)
+                if seat is not None:
+                    return Placement(CONFIRMED, seat)
+            return self._enqueue(user_id, approved=True)
+
+    def release(self, user_id: int, confirmed: bool = False) -> List[Placement]:
+        """
+        Receipt rejected: frees a held seat / unapproved waitlist place. A seat
+        or place already paid for is only freed with confirmed=True
+        (registration cancelled). Returns the users promoted into the freed seat.
+        """
+        if self.is_confirmed(user_id) and not confirmed:
+            return []
+        with self._conn:
+            if user_id in self._waitlist:
+                self._dequeue(user_id)
+                return []
+            seat = self._seats.get(user_id)
+            return self._free_seat(seat) if seat is not None else []
+
+    def expire_due(self, now: Optional[float] = None) -> Tuple[List[Seat], List[Placement]]:
+        """
+        Releases holds past their expiry. Returns (expired seats, promotions).
+        """
+        now = now or time.time()
+        expired = [s for s in self._seats.values() if s.status == HELD and s.expires_at and s.expires_at <= now]
+        promoted: List[Placement] = []
+        with self._conn:
+            for seat in expired:
+                promoted += self._free_seat(seat)
+        return expired, promoted
+
+    def next_expiry(self) -> Optional[float]:
+        return min((s.expires_at for s in self._seats.values() if s.status == HELD and s.expires_at), default=None)
+
+    def stats(self) -> Dict[str, object]:
+        per_lobby = {lobby: 0 for lobby in range(1, self.lobby_count + 1)}
+        held = 0
+        for seat in self._seats.values():
+            per_lobby[seat.lobby] = per_lobby.get(seat.lobby, 0) + 1
+            held += seat.status == HELD
+        return {
+            "capacity": self.capacity,
+            "taken": len(self._seats),
+            "held": held,
+            "free": len(self._free),
+            "waitlist": len(self._waitlist),
+            "per_lobby": per_lobby,
+        }
+
+    def close(self):
+        self._conn.close()
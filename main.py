@@ -7,9 +7,12 @@ Tavsiyalar:
 - Agar SHEET_JSON faylni to'g'ridan-to'g'ri yuklash mumkin bo'lsa, SHEET_JSON="Reyting-bot.json".
 - Yoki SHEET_JSON_DATA ga butun JSON (string) ni qo'ying.
 - Yoki SHEET_JSON_B64 ga base64 kodlangan JSON joylashtiring.
+- SPREADSHEET_KEY (jadval URL'idagi ID) berilsa, jadval nom bo'yicha qidirilmaydi — ishga tushish tezroq.
 
 Important:
 - Botni bitta joyda (faqat Render) ishlating — "Conflict: terminated by other getUpdates request" xatosini oldini olish uchun.
+- Webhook rejimi: BOT_MODE=webhook, WEBHOOK_BASE_URL=https://... (WEBHOOK_SECRET, PORT ixtiyoriy).
+  Bu holda polling ishlatilmaydi va Render'da "web" service sifatida ishga tushiring.
 """
 
 import os
@@ -18,7 +21,11 @@ import logging
 import contextlib
 import json
 import base64
-from typing import Union, Optional, List
+import threading
+import hashlib
+import html
+import time
+from typing import Union, Optional, List, Dict
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -29,17 +36,36 @@ from oauth2client.service_account import ServiceAccountCredentials
 from aiogram import Bot, Dispatcher, F
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import (
-    Message, CallbackQuery,
+    Message, CallbackQuery, InputMediaPhoto,
     InlineKeyboardMarkup, InlineKeyboardButton,
     ReplyKeyboardMarkup, KeyboardButton
 )
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.base import StorageKey
-from aiogram.exceptions import TelegramAPIError
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest
+
+from sheets_gateway import SheetsGateway
+from registrations import Registration, RegistrationStore, NO_PUBG_ID
+from sheet_sync import SheetSync
+from subscription_cache import SubscriptionCache
+from scheduler import DelayedScheduler
+from fsm_storage import SQLiteStorage
+from webhook import WebhookServer, run_webhook
+from review_queue import ReviewDispatcher, Receipt, APPROVED, REJECTED
+import outbound
+from outbound import OutboundScheduler, NOTIFICATION
+from broadcast import BroadcastEngine
+from matches import MatchStore, parse_csv, parse_result_rows
+from standings import StandingsEngine, Standing, NOT_REGISTERED
+from throttling import ThrottlingMiddleware
+from receipt_index import ReceiptIndex, ReceiptMatch
+from lobbies import LobbyManager, Placement, HELD, CONFIRMED, WAITLISTED
+import cards
+from cards import CardRenderer
+from metrics import Metrics, HandlerMetrics, BotApiMetrics, metrics_handler, start_metrics_server
 
 # ----------------------------
 # CONFIG (from .env)
@@ -49,7 +75,64 @@ ADMIN_IDS_RAW = os.getenv("ADMIN_ID", "").strip()  # can be "123,456"
 SHEET_JSON = os.getenv("SHEET_JSON", "Reyting-bot.json").strip()
 SHEET_JSON_DATA = os.getenv("SHEET_JSON_DATA", "").strip()  # raw JSON string
 SHEET_JSON_B64 = os.getenv("SHEET_JSON_B64", "").strip()    # base64 encoded JSON
-REQUIRED_CHANNEL = os.getenv("REQUIRED_CHANNEL", "@M24SHaxa_youtube").strip()
+REQUIRED_CHANNEL = os.getenv("REQUIRED_CHANNEL", "@M24SHaxa_youtube").strip()  # can be "@a,@b"
+REQUIRED_CHANNELS = [c.strip() for c in REQUIRED_CHANNEL.split(",") if c.strip()]
+SUBSCRIPTION_TTL = float(os.getenv("SUBSCRIPTION_TTL", "600"))
+SUBSCRIPTION_NEGATIVE_TTL = float(os.getenv("SUBSCRIPTION_NEGATIVE_TTL", "30"))
+SUBSCRIPTION_CACHE_SIZE = int(os.getenv("SUBSCRIPTION_CACHE_SIZE", "50000"))
+SHEETS_MAX_WORKERS = int(os.getenv("SHEETS_MAX_WORKERS", "4"))
+SHEETS_TIMEOUT = float(os.getenv("SHEETS_TIMEOUT", "15"))
+DB_PATH = os.getenv("DB_PATH", "bot.db").strip()
+# open the spreadsheet by key (the ID in its URL) to skip the Drive search done by open(name)
+SPREADSHEET_KEY = os.getenv("SPREADSHEET_KEY", "").strip()
+TOURNAMENT = os.getenv("TOURNAMENT", "default").strip()
+SHEET_WRITE_WINDOW = float(os.getenv("SHEET_WRITE_WINDOW", "1.0"))  # seconds to batch registrations
+SHEET_IMPORT_INTERVAL = float(os.getenv("SHEET_IMPORT_INTERVAL", "60"))  # seconds between sheet imports
+MY_GAMES_PAGE_SIZE = 5
+LEADERBOARD_PAGE_SIZE = max(1, min(int(os.getenv("LEADERBOARD_PAGE_SIZE", "20")), 30))
+# leaderboard as an image card (needs Pillow); rendered in CARD_WORKERS processes, cached by content
+LEADERBOARD_CARDS = os.getenv("LEADERBOARD_CARDS", "1").strip() == "1" and cards.available()
+CARD_WORKERS = int(os.getenv("CARD_WORKERS", "2"))
+CARD_FONT = os.getenv("CARD_FONT", "").strip()  # .ttf path; DejaVu Sans or Pillow's built-in font otherwise
+# paging a card waits at most this long for a render slot, then the page is sent as text
+CARD_PAGE_WAIT = float(os.getenv("CARD_PAGE_WAIT", "3"))
+RESULTS_CSV_MAX_BYTES = 2 * 1024 * 1024
+FSM_STATE_TTL = float(os.getenv("FSM_STATE_TTL", str(7 * 24 * 3600)))  # idle FSM states expire after this
+
+# update delivery: "polling" (default) or "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling").strip().lower()
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "").strip()  # e.g. https://my-bot.onrender.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook").strip()
+# the same on every instance (all of them register and check it), so by default derived from the token
+WEBHOOK_SECRET = (os.getenv("WEBHOOK_SECRET", "").strip()
+                  or hashlib.sha256(f"webhook-secret:{BOT_TOKEN}".encode()).hexdigest())
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0").strip()
+WEB_PORT = int(os.getenv("PORT", "8080"))
+# Prometheus endpoint, off unless METRICS_PATH is set (e.g. /metrics): served on the webhook server
+# only with METRICS_TOKEN, in polling mode on METRICS_PORT
+METRICS_PATH = os.getenv("METRICS_PATH", "").strip()
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "").strip()  # bearer token
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# outbound pacing (Telegram flood limits)
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))  # messages/second, all chats
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))       # messages/second, per chat
+OUTBOUND_CHAT_BURST = int(os.getenv("OUTBOUND_CHAT_BURST", "3"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "20"))
+# lobby capacity: LOBBY_COUNT lobbies of LOBBY_SIZE seats (0 = unlimited); seats are held SEAT_HOLD_SECONDS until approved
+LOBBY_SIZE = int(os.getenv("LOBBY_SIZE", "8"))
+LOBBY_COUNT = int(os.getenv("LOBBY_COUNT", "0"))
+SEAT_HOLD_SECONDS = float(os.getenv("SEAT_HOLD_SECONDS", "1800"))
+# duplicate receipts: "reject" answers a file already sent by another user automatically, "flag" only warns the admin
+RECEIPT_DUPLICATE_ACTION = os.getenv("RECEIPT_DUPLICATE_ACTION", "reject").strip().lower()
+RECEIPT_NEAR_DISTANCE = int(os.getenv("RECEIPT_NEAR_DISTANCE", "4"))  # max differing bits of the 64-bit image hash
+RECEIPT_HASH_WORKERS = int(os.getenv("RECEIPT_HASH_WORKERS", "2"))
+RECEIPT_HASH_MAX_BYTES = int(os.getenv("RECEIPT_HASH_MAX_BYTES", str(5 * 1024 * 1024)))
+# anti-flood for expensive handlers (leaderboard, subscription checks): presses/second and burst per user
+THROTTLE_RATE = float(os.getenv("THROTTLE_RATE", "0.5"))
+THROTTLE_BURST = int(os.getenv("THROTTLE_BURST", "3"))
 
 # parse admin ids into list of ints
 ADMINS: List[int] = []
@@ -67,8 +150,6 @@ if not ADMINS:
     except Exception:
         ADMINS = []
 
-if not BOT_TOKEN:
-    raise RuntimeError("BOT_TOKEN is not set. Put it into .env as BOT_TOKEN=your_token")
 
 # ----------------------------
 # LOGGING
@@ -86,14 +167,56 @@ if not ADMINS:
 # ----------------------------
 # BOT SETUP
 # ----------------------------
-bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-dp = Dispatcher(storage=MemoryStorage())
+# the Bot (and what needs it) is created by create_bot() in main(), so importing this module has no network
+# side effects and does not require BOT_TOKEN
+bot: Optional[Bot] = None
+broadcasts: Optional[BroadcastEngine] = None
+sender = OutboundScheduler(global_rate=OUTBOUND_GLOBAL_RATE, chat_rate=OUTBOUND_CHAT_RATE,
+                           chat_burst=OUTBOUND_CHAT_BURST)
+metrics = Metrics()
+startup_timings: Dict[str, float] = {}  # phase -> milliseconds, shown in /stats
+
+@contextlib.contextmanager
+def startup_phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[name] = round((time.perf_counter() - started) * 1000, 1)
+        logger.info("Startup: %s took %.1f ms", name, startup_timings[name])
+
+def create_bot(token: str) -> Bot:
+    global bot, broadcasts
+    bot = Bot(token=token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    bot.session.middleware(sender)
+    bot.session.middleware(BotApiMetrics(metrics))  # inner to `sender`: times requests, not pacing waits
+    broadcasts = BroadcastEngine(bot, DB_PATH, concurrency=BROADCAST_CONCURRENCY)
+    return bot
+
+dp = Dispatcher(storage=SQLiteStorage(DB_PATH, ttl=FSM_STATE_TTL))
+scheduler = DelayedScheduler()
+reviews = ReviewDispatcher(DB_PATH, ADMINS)
+lobbies = LobbyManager(DB_PATH, TOURNAMENT, LOBBY_SIZE, LOBBY_COUNT, hold_seconds=SEAT_HOLD_SECONDS)
+receipt_index = ReceiptIndex(DB_PATH, max_distance=RECEIPT_NEAR_DISTANCE, hash_workers=RECEIPT_HASH_WORKERS)
+card_renderer = (CardRenderer(DB_PATH, max_workers=CARD_WORKERS, font_path=CARD_FONT, metrics=metrics)
+                 if LEADERBOARD_CARDS else None)
+_expensive = (THROTTLE_RATE, THROTTLE_BURST)
+throttle = ThrottlingMiddleware(
+    {action: _expensive for action in (
+        "reyting", "results", "check_subscription", "start", "register", "mygames", "my_games")},
+    exempt=ADMINS,
+)
+dp.message.outer_middleware(throttle)
+dp.callback_query.outer_middleware(throttle)
+dp.message.middleware(HandlerMetrics(metrics))
+dp.callback_query.middleware(HandlerMetrics(metrics))
 
 # ----------------------------
 # GOOGLE SHEETS HELPERS (with caching & flexible credentials)
 # ----------------------------
 _gspread_client: Optional[gspread.client.Client] = None
 _gspread_sheet = None
+_gspread_lock = threading.Lock()  # connect_to_sheet runs in gateway worker threads
 
 def _load_service_account_creds(scope):
     """
@@ -136,29 +259,79 @@ def _load_service_account_creds(scope):
 def connect_to_sheet(spreadsheet_name: str = "Pubg Reyting", worksheet_name: str = "Reyting-bot"):
     """
     Returns a gspread Worksheet object. Caches the client/worksheet.
+    Blocking — call it through `sheets` (SheetsGateway) from async code.
     """
-    global _gspread_client, _gspread_sheet
     if _gspread_sheet:
         return _gspread_sheet
+    with _gspread_lock:
+        if _gspread_sheet:
+            return _gspread_sheet
+        return _connect_to_sheet(spreadsheet_name, worksheet_name)
+
+def _connect_to_sheet(spreadsheet_name: str, worksheet_name: str):
+    global _gspread_client, _gspread_sheet
     try:
         scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
         creds = _load_service_account_creds(scope)
         _gspread_client = gspread.authorize(creds)
-        _gspread_sheet = _gspread_client.open(spreadsheet_name).worksheet(worksheet_name)
-        logger.info("Connected to Google Sheet: %s / %s", spreadsheet_name, worksheet_name)
+        if SPREADSHEET_KEY:
+            spreadsheet = _gspread_client.open_by_key(SPREADSHEET_KEY)
+        else:
+            logger.info("SPREADSHEET_KEY is not set; looking the spreadsheet up by name (slower)")
+            spreadsheet = _gspread_client.open(spreadsheet_name)
+        _gspread_sheet = spreadsheet.worksheet(worksheet_name)
+        logger.info("Connected to Google Sheet: %s / %s", spreadsheet.title, worksheet_name)
         return _gspread_sheet
     except Exception as e:
         logger.exception("Google Sheetsga ulanishda xatolik:")
         raise
 
-def append_to_sheet(nickname: str, pubg_id: str):
+sheets = SheetsGateway(connect_to_sheet, max_workers=SHEETS_MAX_WORKERS, timeout=SHEETS_TIMEOUT, metrics=metrics)
+registrations = RegistrationStore(DB_PATH, TOURNAMENT)
+matches = MatchStore(DB_PATH, TOURNAMENT)
+
+async def _on_row_committed(user_id: Optional[int], row: list):
+    if user_id:
+        with contextlib.suppress(TelegramAPIError), outbound.priority(NOTIFICATION):
+            await bot.send_message(user_id, "✅ Reytingga qoʻshildi. Rahmat!")
+
+standings = StandingsEngine()
+
+def _standings_player(reg: Registration) -> str:
+    # players are ranked by PUBG ID; registrations without one stay separate rows
+    return f"reg:{reg.id}" if reg.pubg_id == NO_PUBG_ID else reg.pubg_id
+
+def rebuild_standings(_changed: int = 0):
+    """
+    Full rebuild from the local store (startup and after hand edits in the sheet);
+    everything else updates the standings incrementally.
+    """
+    entries = {}
+    for reg in registrations.list(limit=-1):
+        entries.setdefault(_standings_player(reg), [reg.pubg_id, reg.nickname, 0, 0, 0, 0, 0, None, reg.id])
+    for st in matches.all_stats():
+        entry = entries.setdefault(st.pubg_id, [st.pubg_id, st.nickname, 0, 0, 0, 0, 0, None, NOT_REGISTERED])
+        entry[2:8] = [st.points, st.placement_points, st.kills, st.wins, st.matches, st.best_placement]
+    standings.load((player, *entry) for player, entry in entries.items())
+
+sheet_sync = SheetSync(sheets, registrations, window=SHEET_WRITE_WINDOW, pull_interval=SHEET_IMPORT_INTERVAL,
+                       on_committed=_on_row_committed, on_imported=rebuild_standings)
+
+def append_to_sheet(nickname: str, pubg_id: str, user_id: Optional[int] = None) -> bool:
+    """
+    Saves the registration locally; SheetSync mirrors it to the sheet with the
+    next batch and the user is notified once it is there.
+    """
     try:
-        sheet = connect_to_sheet()
-        sheet.append_row([nickname, pubg_id])
-        logger.info("Row added to sheet: %s | %s", nickname, pubg_id)
+        reg = registrations.add(user_id, nickname, pubg_id)
+        sheet_sync.nudge()
+        # also for players already ranked from imported results: their row gets the registered name and order
+        standings.set_player(_standings_player(reg), reg.pubg_id, reg.nickname, reg.id)
+        logger.info("Registration saved: %s | %s", nickname, pubg_id)
         return True
     except Exception:
-        logger.exception("sheet append error")
+        logger.exception("registration save error")
+        metrics.error("store", "registration_add")
         return False
 
 # ----------------------------
@@ -202,12 +375,13 @@ youtube_keyboard = InlineKeyboardMarkup(
     ]
 )
 
-def approve_buttons_template(user_id: int) -> InlineKeyboardMarkup:
+def approve_buttons_template(user_id: int, receipt_id: Optional[int] = None) -> InlineKeyboardMarkup:
+    suffix = f":{receipt_id}" if receipt_id is not None else ""
     return InlineKeyboardMarkup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text="✅ To‘g‘ri", callback_data=f"approve:{user_id}"),
-                InlineKeyboardButton(text="❌ Noto‘g‘ri", callback_data=f"reject:{user_id}")
+                InlineKeyboardButton(text="✅ To‘g‘ri", callback_data=f"approve:{user_id}{suffix}"),
+                InlineKeyboardButton(text="❌ Noto‘g‘ri", callback_data=f"reject:{user_id}{suffix}")
             ]
         ]
     )
@@ -215,30 +389,44 @@ def approve_buttons_template(user_id: int) -> InlineKeyboardMarkup:
 # ----------------------------
 # SUBSCRIPTION CHECK
 # ----------------------------
-async def check_subscription(user_id: int) -> bool:
+async def _is_channel_member(channel: str, user_id: int) -> bool:
+    member = await bot.get_chat_member(channel, user_id)
+    # member.status can be 'member', 'creator', 'administrator', 'left', 'kicked'
+    return member.status in {"member", "creator", "administrator"}
+
+subscriptions = SubscriptionCache(
+    _is_channel_member, REQUIRED_CHANNELS,
+    positive_ttl=SUBSCRIPTION_TTL, negative_ttl=SUBSCRIPTION_NEGATIVE_TTL, maxsize=SUBSCRIPTION_CACHE_SIZE
+)
+
+async def check_subscription(user_id: int, force: bool = False) -> bool:
     """
-    Returns True if a user is member/creator/administrator of REQUIRED_CHANNEL.
-    Handles API errors gracefully.
+    Returns True if a user is member/creator/administrator of every REQUIRED_CHANNELS entry.
+    Results are cached (see SubscriptionCache); `force` skips the cache.
+    API errors are logged and treated as "not subscribed".
     """
-    try:
-        member = await bot.get_chat_member(REQUIRED_CHANNEL, user_id)
-        # member.status can be 'member', 'creator', 'administrator', 'left', 'kicked'
-        return member.status in {"member", "creator", "administrator"}
-    except TelegramAPIError as e:
-        logger.warning("check_subscription TelegramAPIError for user %s: %s", user_id, e)
-        return False
-    except Exception as e:
-        logger.warning("check_subscription unexpected error for user %s: %s", user_id, e)
-        return False
+    with metrics.timer("subscription", "check_subscription"):
+        return await subscriptions.is_subscribed(user_id, force=force)
 
 # ----------------------------
 # PAYMENT FLOW
 # ----------------------------
+async def delete_message_later(chat_id: int, message_id: int, delay: float):
+    """
+    Best-effort delete of a message after `delay` seconds, without holding the handler.
+    """
+    async def _delete():
+        with contextlib.suppress(Exception):
+            await bot.delete_message(chat_id, message_id)
+    scheduler.call_later(delay, _delete)
+
 async def ask_for_payment(target: Union[Message, CallbackQuery], state: FSMContext):
     """
     Send payment instructions directly to the user (private).
+    The state is set first, so a receipt sent right away is not lost.
     """
     user_id = target.from_user.id
+    await state.set_state(RegistrationState.waiting_for_payment_check)
     text = (
         "💳 <b>Karta turi:</b> HUMO\n"
         "💳 <b>Karta raqami:</b> <code>9860 6004 1512 3691</code>\n\n"
@@ -246,11 +434,8 @@ async def ask_for_payment(target: Union[Message, CallbackQuery], state: FSMConte
     )
     msg = await bot.send_message(user_id, text)
     # auto-delete the instructional message after 5 seconds (best-effort)
-    await asyncio.sleep(5)
-    with contextlib.suppress(Exception):
-        await bot.delete_message(user_id, msg.message_id)
+    await delete_message_later(user_id, msg.message_id, 5)
     await bot.send_message(user_id, "✅ Endi to‘lovni amalga oshirgach, <b>chekni yuboring</b> (rasm yoki fayl):")
-    await state.set_state(RegistrationState.waiting_for_payment_check)
 
 # ----------------------------
 # START HANDLER
@@ -287,11 +472,46 @@ async def cmd_register(message: Message, state: FSMContext):
         return
     await ask_for_payment(message, state)
 
+def my_games_page(user_id: int, page: int = 0):
+    """
+    Returns (text, keyboard or None) for one page of a user's match history.
+    Totals come from precomputed player_stats; only the visible page is queried.
+    """
+    regs = registrations.by_user(user_id)
+    if not regs:
+        return "🎮 Sizda hozircha o‘yin yo‘q.", None
+    pubg_ids = sorted({reg.pubg_id for reg in regs if reg.pubg_id != NO_PUBG_ID})
+    stats = matches.stats_for(pubg_ids)
+    lines = ["🎮 <b>Mening o‘yinlarim</b>\n"]
+    for reg in regs:
+        lines.append(f"👤 {html.escape(reg.nickname)} (ID: {html.escape(reg.pubg_id)}) — {html.escape(reg.tournament)}")
+    total = sum(st.matches for st in stats)
+    if not total:
+        lines.append("\nHali o‘yin natijalari yo‘q.")
+        return "\n".join(lines), None
+    lines.append(
+        f"\n🎯 O‘yinlar: {total} | 💀 Kill: {sum(st.kills for st in stats)} | ⭐ Ochko: {sum(st.points for st in stats)}\n"
+        f"🥇 G‘alabalar: {sum(st.wins for st in stats)} | "
+        f"🏅 Eng yaxshi o‘rin: #{min(st.best_placement for st in stats if st.best_placement)}"
+    )
+    pages = (total + MY_GAMES_PAGE_SIZE - 1) // MY_GAMES_PAGE_SIZE
+    page = max(0, min(page, pages - 1))
+    lines.append(f"\n📜 O‘yinlar tarixi ({page + 1}/{pages}):")
+    for entry in matches.history(pubg_ids, MY_GAMES_PAGE_SIZE, page * MY_GAMES_PAGE_SIZE):
+        lines.append(f"• {html.escape(entry.name)}: #{entry.placement}, {entry.kills} kill, +{entry.points}")
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton(text="◀️", callback_data=f"mygames_page:{page - 1}"))
+    if page < pages - 1:
+        nav.append(InlineKeyboardButton(text="▶️", callback_data=f"mygames_page:{page + 1}"))
+    return "\n".join(lines), InlineKeyboardMarkup(inline_keyboard=[nav]) if nav else None
+
 @dp.message(Command("mygames"))
 async def cmd_mygames(message: Message):
     if not await require_subscription(message):
         return
-    await message.answer("🎮 Sizda hozircha o‘yin yo‘q.")
+    text, keyboard = my_games_page(message.from_user.id)
+    await message.answer(text, reply_markup=keyboard)
 
 @dp.message(Command("contactwithadmin"))
 async def cmd_contact_admin(message: Message):
@@ -315,23 +535,122 @@ async def cmd_help(message: Message):
         "/start\n/register\n/mygames\n/contactwithadmin\n/about\n/help\n/reyting"
     )
 
-@dp.message(Command("reyting"))
-async def cmd_reyting(message: Message):
+def my_standing(user_id: int) -> Optional[Standing]:
+    """
+    Best-ranked standing among the user's registrations.
+    """
+    ranked = [standings.rank(_standings_player(reg)) for reg in registrations.by_user(user_id)]
+    ranked = [st for st in ranked if st is not None]
+    return min(ranked, key=lambda st: st.rank) if ranked else None
+
+# with clipped names a line is < 110 visible chars, so 30 lines stay under Telegram's 4096
+_LB_NICK_MAX = 32
+_LB_ID_MAX = 20
+# page -> (text, keyboard); rendered once per standings.version
+_leaderboard_pages = {}
+_leaderboard_version = -1
+
+def _clip(value: str, limit: int) -> str:
+    return value if len(value) <= limit else value[:limit - 1] + "…"
+
+def _leaderboard_nav(page: int, pages: int) -> InlineKeyboardMarkup:
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton(text="◀️", callback_data=f"lb:{page - 1}"))
+    nav.append(InlineKeyboardButton(text="📍", callback_data="lb:me"))
+    if page < pages - 1:
+        nav.append(InlineKeyboardButton(text="▶️", callback_data=f"lb:{page + 1}"))
+    return InlineKeyboardMarkup(inline_keyboard=[nav])
+
+def _render_leaderboard_page(page: int, pages: int):
+    lines = [f"🏆 Reyting ({page + 1}/{pages}):\n"]
+    for st in standings.top(LEADERBOARD_PAGE_SIZE, page * LEADERBOARD_PAGE_SIZE):
+        lines.append(f"{st.rank}. {html.escape(_clip(st.nickname, _LB_NICK_MAX))}"
+                     f" (ID: {html.escape(_clip(st.pubg_id, _LB_ID_MAX))}) — {st.points} ochko, {st.kills} kill")
+    return "\n".join(lines), _leaderboard_nav(page, pages)
+
+def _resolve_leaderboard_page(page: Optional[int], user_id: Optional[int]):
+    """
+    Returns (page, pages, user's standing or None); page=None means the page holding the user.
+    """
+    mine = my_standing(user_id) if user_id else None
+    pages = (len(standings) + LEADERBOARD_PAGE_SIZE - 1) // LEADERBOARD_PAGE_SIZE
+    if page is None:
+        page = (mine.rank - 1) // LEADERBOARD_PAGE_SIZE if mine else 0
+    return max(0, min(page, pages - 1)), pages, mine
+
+def _my_place_line(mine: Optional[Standing]) -> str:
+    if mine is None:
+        return ""
+    return f"\n\n📍 Sizning o‘rningiz: #{mine.rank} / {len(standings)} — {mine.points} ochko"
+
+def leaderboard_page(page: Optional[int] = 0, user_id: Optional[int] = None):
+    """
+    Returns (text, keyboard or None) for one leaderboard page. Pages are
+    rendered once and reused until the standings change; only the user's own
+    place is added per request. page=None opens the page holding the user.
+    """
+    global _leaderboard_version
+    if not len(standings):
+        return "📊 Reytinglar hali mavjud emas.", None
+    if _leaderboard_version != standings.version:
+        _leaderboard_pages.clear()
+        _leaderboard_version = standings.version
+    page, pages, mine = _resolve_leaderboard_page(page, user_id)
+    cached = _leaderboard_pages.get(page)
+    if cached is None:
+        cached = _leaderboard_pages[page] = _render_leaderboard_page(page, pages)
+    text, keyboard = cached
+    return text + _my_place_line(mine), keyboard
+
+async def send_leaderboard_card(message: Message, page: Optional[int], user_id: int, edit: bool = False) -> bool:
+    """
+    Sends the page as an image card (edit=True: swaps it into `message`, which
+    must be a card, and waits up to CARD_PAGE_WAIT for a render slot). The
+    picture only holds the shared rows, so it is cached by content; the
+    user's own place goes into the caption. Returns False if cards are off,
+    busy (new cards only) or failed.
+    """
+    if card_renderer is None or not len(standings):
+        return False
+    page, pages, mine = _resolve_leaderboard_page(page, user_id)
+    rows = [(st.rank, st.nickname, st.pubg_id, st.points, st.kills, st.wins)
+            for st in standings.top(LEADERBOARD_PAGE_SIZE, page * LEADERBOARD_PAGE_SIZE)]
+    caption = f"🏆 Reyting ({page + 1}/{pages})" + _my_place_line(mine)
+    keyboard = _leaderboard_nav(page, pages)
+
+    async def send(photo) -> Optional[str]:
+        if edit:
+            sent = await message.edit_media(InputMediaPhoto(media=photo, caption=caption), reply_markup=keyboard)
+        else:
+            sent = await message.answer_photo(photo, caption=caption, reply_markup=keyboard)
+        return sent.photo[-1].file_id if isinstance(sent, Message) and sent.photo else None
+
     try:
-        sheet = connect_to_sheet()
-        data = sheet.get_all_values()
+        return await card_renderer.deliver(f"Reyting — {TOURNAMENT}", rows, f"{page + 1} / {pages}", send,
+                                           wait=CARD_PAGE_WAIT if edit else 0.0)
+    except TelegramBadRequest as e:
+        if "not modified" in e.message:  # 📍 pressed on the page already shown
+            return True
+        logger.warning("Leaderboard card failed, sending text: %s", e)
+        return False
     except Exception:
-        await message.answer("⚠️ Reytingni olishda xatolik yuz berdi.")
+        logger.exception("Leaderboard card failed, sending text")
+        return False
+
+@dp.message(Command("reyting"))
+async def cmd_reyting(message: Message):
+    if await send_leaderboard_card(message, 0, message.from_user.id):
         return
-    if len(data) <= 1:
-        await message.answer("📊 Reytinglar hali mavjud emas.")
+    text, keyboard = leaderboard_page(0, message.from_user.id)
+    await message.answer(text, reply_markup=keyboard)
+
+@dp.message(Command("syncstats"))
+async def cmd_syncstats(message: Message):
+    if message.from_user.id not in ADMINS:
         return
-    lines = ["🏆 Reyting:\n"]
-    for idx, row in enumerate(data[1:21], start=1):
-        nickname = row[0] if len(row) > 0 else "-"
-        pubg_id = row[1] if len(row) > 1 else "-"
-        lines.append(f"{idx}. {nickname} (ID: {pubg_id})")
-    await message.answer("\n".join(lines))
+    stats = sheet_sync.stats()
+    await message.answer("🔄 Jadval sinxronizatsiyasi:\n" + "\n".join(f"{k}: {v}" for k, v in stats.items()))
 
 # ----------------------------
 # CALLBACK HANDLERS
@@ -339,7 +658,7 @@ async def cmd_reyting(message: Message):
 @dp.callback_query(F.data == "check_subscription")
 async def subscription_callback(call: CallbackQuery):
     user_id = call.from_user.id
-    if await check_subscription(user_id):
+    if await check_subscription(user_id, force=True):
         await call.message.edit_text(
             "✅ Obunangiz tasdiqlandi. Endi botdan to‘liq foydalanishingiz mumkin.",
             reply_markup=inline_main_buttons
@@ -369,28 +688,52 @@ async def register_callback(call: CallbackQuery, state: FSMContext):
 # ----------------------------
 @dp.callback_query(F.data == "results")
 async def results_callback(call: CallbackQuery):
-    try:
-        sheet = connect_to_sheet()
-        data = sheet.get_all_values()
-    except Exception:
-        await call.message.answer("⚠️ Reytingni olishda xatolik yuz berdi.")
-        await call.answer()
-        return
-    if len(data) <= 1:
-        await call.message.answer("📊 Reytinglar hali mavjud emas.")
+    if not await send_leaderboard_card(call.message, 0, call.from_user.id):
+        text, keyboard = leaderboard_page(0, call.from_user.id)
+        await call.message.answer(text, reply_markup=keyboard)
+    await call.answer()
+
+@dp.callback_query(F.data.startswith("lb:"))
+async def leaderboard_page_callback(call: CallbackQuery):
+    raw = call.data.split(":")[1]
+    if raw == "me":
+        page = None
+    elif raw.isdigit():
+        page = int(raw)
+    else:
         await call.answer()
         return
-    lines = ["🏆 Reyting:\n"]
-    for idx, row in enumerate(data[1:21], start=1):
-        nickname = row[0] if len(row) > 0 else "-"
-        pubg_id = row[1] if len(row) > 1 else "-"
-        lines.append(f"{idx}. {nickname} (ID: {pubg_id})")
-    await call.message.answer("\n".join(lines))
+    # answered first: a render may take a while, and Telegram drops answers to old queries
     await call.answer()
+    if call.message.photo:
+        if await send_leaderboard_card(call.message, page, call.from_user.id, edit=True):
+            return
+        # a photo can't be edited into text: the card is replaced by the text page, which pages as text from now on
+        text, keyboard = leaderboard_page(page, call.from_user.id)
+        await call.message.answer(text, reply_markup=keyboard)
+        with contextlib.suppress(TelegramAPIError):
+            await call.message.delete()
+        return
+    text, keyboard = leaderboard_page(page, call.from_user.id)
+    with contextlib.suppress(TelegramAPIError):  # "message is not modified"
+        await call.message.edit_text(text, reply_markup=keyboard)
 
 @dp.callback_query(F.data == "my_games")
 async def my_games_callback(call: CallbackQuery):
-    await call.message.answer("🎮 Sizda hozircha o‘yin yo‘q.")
+    text, keyboard = my_games_page(call.from_user.id)
+    await call.message.answer(text, reply_markup=keyboard)
+    await call.answer()
+
+@dp.callback_query(F.data.startswith("mygames_page:"))
+async def my_games_page_callback(call: CallbackQuery):
+    try:
+        page = int(call.data.split(":")[1])
+    except ValueError:
+        await call.answer()
+        return
+    text, keyboard = my_games_page(call.from_user.id, page)
+    with contextlib.suppress(TelegramAPIError):  # "message is not modified"
+        await call.message.edit_text(text, reply_markup=keyboard)
     await call.answer()
 
 @dp.callback_query(F.data == "contact_admin")
@@ -401,79 +744,390 @@ async def contact_admin_callback(call: CallbackQuery):
 # ----------------------------
 # PAYMENT CHECK HANDLER
 # ----------------------------
+def placement_text(placement: Placement) -> str:
+    if placement.status == WAITLISTED:
+        return f"⏳ Barcha o‘rinlar band — siz navbatda #{placement.position}."
+    seat = placement.seat
+    if placement.status == HELD:
+        return f"🎫 Lobbi #{seat.lobby}, o‘rin #{seat.seat} siz uchun vaqtincha band qilindi."
+    return f"🎫 Lobbi #{seat.lobby}, o‘rin #{seat.seat} sizniki."
+
+def admin_placement_note(placement: Placement) -> str:
+    if placement.status == WAITLISTED:
+        return f"⏳ Navbatda #{placement.position}"
+    return f"🎫 Lobbi #{placement.seat.lobby}, o‘rin #{placement.seat.seat}"
+
+_expiry_job = None
+_expiry_at = 0.0
+
+def _schedule_hold_expiry():
+    """
+    Keeps exactly one timer, set for the earliest seat hold.
+    """
+    global _expiry_job, _expiry_at
+    next_expiry = lobbies.next_expiry()
+    if next_expiry is None or (_expiry_job is not None and _expiry_at <= next_expiry):
+        return
+    if _expiry_job is not None:
+        _expiry_job.cancel()
+    _expiry_at = next_expiry
+    _expiry_job = scheduler.call_later(max(0.0, next_expiry - time.time()) + 1, _expire_holds)
+
+async def _announce_promotions(promotions: List[Placement]):
+    """
+    Tells waitlisted users that a seat was freed for them.
+    """
+    for placement in promotions:
+        user_id = placement.seat.user_id
+        if placement.status == CONFIRMED:
+            # payment already approved while waitlisted: continue the registration
+            key = StorageKey(bot_id=bot.id, chat_id=user_id, user_id=user_id)
+            await dp.storage.set_state(key, RegistrationState.waiting_for_pubg_nick.state)
+            text = f"🎉 Joy bo‘shadi! {placement_text(placement)}\nEndi PUBG nickname va ID'ingizni yuboring."
+        else:
+            _schedule_hold_expiry()
+            text = f"🎉 Navbatingiz keldi! {placement_text(placement)}\nChekingiz tekshirilmoqda."
+        with contextlib.suppress(TelegramAPIError), outbound.priority(NOTIFICATION):
+            await bot.send_message(user_id, text)
+
+async def _expire_holds():
+    global _expiry_job
+    _expiry_job = None
+    expired, promotions = lobbies.expire_due()
+    _schedule_hold_expiry()
+    for seat in expired:
+        logger.info("Seat hold expired: user %s, lobby %s seat %s", seat.user_id, seat.lobby, seat.seat)
+        with contextlib.suppress(TelegramAPIError), outbound.priority(NOTIFICATION):
+            await bot.send_message(seat.user_id, "⌛ O‘rin band qilish muddati tugadi. Chekingiz tasdiqlansa, "
+                                                 "bo‘sh o‘rin bo‘lsa yana ajratiladi.")
+    await _announce_promotions(promotions)
+
+async def _receipt_hash(message: Message) -> Optional[int]:
+    """
+    Perceptual hash of a receipt image, from the smallest photo size that is still
+    detailed enough. None for non-images, oversized files or download errors.
+    """
+    if message.photo:
+        sizes = [p for p in message.photo if min(p.width, p.height) >= 128] or message.photo[-1:]
+        file = sizes[0]
+    elif (message.document.mime_type or "").startswith("image/"):
+        file = message.document
+    else:
+        return None
+    if (file.file_size or 0) > RECEIPT_HASH_MAX_BYTES:
+        return None
+    try:
+        with metrics.timer("receipts", "hash"):
+            data = await bot.download(file)
+            return await receipt_index.hash_image(data.read())
+    except Exception as e:
+        logger.warning("Receipt hash failed for user %s: %s", message.from_user.id, e)
+        return None
+
+def _duplicate_note(match: ReceiptMatch, user_id: int) -> str:
+    when = time.strftime("%d.%m %H:%M", time.localtime(match.submitted_at))
+    if match.kind == "exact":
+        who = "shu foydalanuvchi" if match.user_id == user_id else f"boshqa foydalanuvchi (<code>{match.user_id}</code>)"
+        return f"\n\n♻️ <b>Takroriy chek!</b> Bu fayl {when} da {who} tomonidan yuborilgan."
+    return (f"\n\n⚠️ <b>O‘xshash chek:</b> {when} da <code>{match.user_id}</code> yuborgan chekka "
+            f"o‘xshaydi (farq: {match.distance}/64).")
+
 @dp.message(RegistrationState.waiting_for_payment_check, F.photo | F.document)
 async def handle_check(message: Message, state: FSMContext):
+    user_id = message.from_user.id
+    if lobbies.enabled and lobbies.is_confirmed(user_id):
+        # already paid and approved: a new receipt must not put the seat up for review (and rejection) again
+        await message.answer("✅ To‘lovingiz allaqachon tasdiqlangan. " + placement_text(lobbies.placement(user_id)))
+        await state.clear()
+        return
+    file_unique_id = (message.photo[-1] if message.photo else message.document).file_unique_id
+    match = receipt_index.find(file_unique_id)
+    if match is not None and match.user_id != user_id and RECEIPT_DUPLICATE_ACTION == "reject":
+        # someone else's receipt re-sent: answer without bothering an admin; keep the state for a real one
+        logger.info("Receipt from user %s rejected: same file as user %s", user_id, match.user_id)
+        await message.answer("❌ Bu chek avval boshqa foydalanuvchi tomonidan yuborilgan. "
+                             "Iltimos, o‘zingizning to‘lov chekingizni yuboring.")
+        return
     await message.answer("🕔 Chekingiz admin tomonidan tekshirilmoqda.")
-    approve_buttons = approve_buttons_template(message.from_user.id)
+    phash = None
+    if match is None:
+        phash = await _receipt_hash(message)
+        match = receipt_index.find(file_unique_id, phash)
+    # least-loaded admin (round-robin among equals)
+    admin_id_to_send = reviews.pick_admin()
+    if not admin_id_to_send:
+        await message.answer("⚠️ Admin hali belgilanmagan — admin funktsiyalari ishlamaydi.")
+        await state.clear()
+        return
+    caption = (("🥾 Yangi chek:\n" if message.photo else "🥾 Yangi chek (fayl):\n") +
+               f"👤 <b>{message.from_user.full_name}</b>\n"
+               f"🆔 <code>{user_id}</code>\n"
+               f"📌 @{message.from_user.username or 'username yoq'}")
+    if match is not None:
+        caption += _duplicate_note(match, user_id)
+    placement = None
+    if lobbies.enabled:
+        # reserved before anything else awaits, so concurrent receipts can't oversell the last seat
+        placement = lobbies.reserve(user_id)
+        if placement.status == HELD:
+            _schedule_hold_expiry()
+        caption += "\n" + admin_placement_note(placement)
+    receipt_index.add(file_unique_id, user_id, phash)
+    receipt, previous = reviews.submit(user_id, admin_id_to_send, caption)
+    if previous is not None:
+        await close_receipt_copies(previous, "♻️ Foydalanuvchi yangi chek yubordi.")
+    approve_buttons = approve_buttons_template(user_id, receipt.id)
     try:
-        # send to first admin in list (if exists)
-        admin_id_to_send = ADMINS[0] if ADMINS else None
-        if not admin_id_to_send:
-            await message.answer("⚠️ Admin hali belgilanmagan — admin funktsiyalari ishlamaydi.")
-            await state.clear()
-            return
-
-        if message.photo:
-            file_id = message.photo[-1].file_id
-            await bot.send_photo(
-                admin_id_to_send, file_id,
-                caption=(f"🥾 Yangi chek:\n👤 <b>{message.from_user.full_name}</b>\n"
-                         f"🆔 <code>{message.from_user.id}</code>\n"
-                         f"📌 @{message.from_user.username or 'username yoq'}"),
-                reply_markup=approve_buttons
-            )
-        else:
-            file_id = message.document.file_id
-            await bot.send_document(
-                admin_id_to_send, file_id,
-                caption=(f"🥾 Yangi chek (fayl):\n👤 <b>{message.from_user.full_name}</b>\n"
-                         f"🆔 <code>{message.from_user.id}</code>\n"
-                         f"📌 @{message.from_user.username or 'username yoq'}"),
-                reply_markup=approve_buttons
-            )
+        with outbound.priority(NOTIFICATION):
+            if message.photo:
+                file_id = message.photo[-1].file_id
+                sent = await bot.send_photo(admin_id_to_send, file_id, caption=caption, reply_markup=approve_buttons)
+            else:
+                file_id = message.document.file_id
+                sent = await bot.send_document(admin_id_to_send, file_id, caption=caption, reply_markup=approve_buttons)
+        reviews.add_message(receipt, sent.chat.id, sent.message_id)
     except Exception as e:
         logger.exception("Failed to send check to admin: %s", e)
+        reviews.cancel(user_id)
+        if placement is not None:
+            await _announce_promotions(lobbies.release(user_id))
         await message.answer("⚠️ Chekni adminga yuborishda xatolik yuz berdi.")
         await state.clear()
         return
     await state.set_state(RegistrationState.waiting_for_admin_approval)
+    if placement is not None:
+        await message.answer(placement_text(placement))
 
 # ----------------------------
 # ADMIN APPROVE/REJECT HANDLER
 # ----------------------------
-@dp.callback_query(F.data.startswith("approve:"))
-async def approve_callback(call: CallbackQuery):
+async def close_receipt_copies(receipt: Receipt, note: str):
+    """
+    Appends the outcome to every admin copy of a receipt and removes its buttons.
+    """
+    for chat_id, message_id in receipt.messages:
+        with contextlib.suppress(Exception), outbound.priority(NOTIFICATION):
+            await bot.edit_message_caption(chat_id=chat_id, message_id=message_id,
+                                           caption=f"{receipt.caption}\n\n{note}", reply_markup=None)
+
+def _parse_review_callback(data: str):
+    """
+    "approve:<user_id>[:<receipt_id>]" -> (user_id, receipt_id or None)
+    """
+    parts = data.split(":")
+    user_id = int(parts[1])
+    receipt_id = int(parts[2]) if len(parts) > 2 else None
+    return user_id, receipt_id
+
+async def _claim_receipt(call: CallbackQuery, decision: str) -> Optional[int]:
+    """
+    Common admin/claim checks. Returns the user_id to act on, or None if the
+    callback was already answered (not an admin, bad data, decided by someone else).
+    """
     if call.from_user.id not in ADMINS:
         await call.answer("Siz admin emassiz.", show_alert=True)
-        return
+        return None
     try:
-        user_id = int(call.data.split(":")[1])
+        user_id, receipt_id = _parse_review_callback(call.data)
     except Exception:
         await call.answer("User ID topilmadi.", show_alert=True)
+        return None
+    ok, receipt = reviews.claim(user_id, call.from_user.id, decision, receipt_id=receipt_id)
+    if not ok:
+        with contextlib.suppress(Exception):
+            await call.message.edit_reply_markup()
+        await call.answer("⚠️ Bu chek allaqachon ko‘rib chiqilgan.", show_alert=True)
+        return None
+    mark = "✅ Tasdiqlandi" if decision == APPROVED else "❌ Rad etildi"
+    if receipt is not None:
+        await close_receipt_copies(receipt, f"{mark}: {call.from_user.full_name}")
+    else:
+        with contextlib.suppress(Exception):
+            await call.message.edit_reply_markup()
+    return user_id
+
+@dp.callback_query(F.data.startswith("approve:"))
+async def approve_callback(call: CallbackQuery):
+    user_id = await _claim_receipt(call, APPROVED)
+    if user_id is None:
         return
-    await bot.send_message(user_id, "✅ Chekingiz tasdiqlandi. Endi PUBG nickname va ID'ingizni yuboring.")
+    seat_line = ""
+    if lobbies.enabled:
+        placement = lobbies.confirm(user_id)
+        if placement.status == WAITLISTED:
+            await bot.send_message(user_id, "✅ Chekingiz tasdiqlandi, lekin hozircha barcha o‘rinlar band.\n"
+                                            f"{placement_text(placement)} O‘rin bo‘shashi bilan xabar beramiz.")
+            await call.answer(f"✅ Tasdiqlandi (navbatda #{placement.position})")
+            return
+        seat_line = placement_text(placement) + "\n"
+    await bot.send_message(user_id, f"✅ Chekingiz tasdiqlandi. {seat_line}Endi PUBG nickname va ID'ingizni yuboring.")
     key = StorageKey(bot_id=bot.id, chat_id=user_id, user_id=user_id)
     await dp.storage.set_state(key, RegistrationState.waiting_for_pubg_nick.state)
-    with contextlib.suppress(Exception):
-        await call.message.edit_reply_markup()
     await call.answer("✅ Tasdiqlandi")
 
 @dp.callback_query(F.data.startswith("reject:"))
 async def reject_callback(call: CallbackQuery):
-    if call.from_user.id not in ADMINS:
-        await call.answer("Siz admin emassiz.", show_alert=True)
-        return
-    try:
-        user_id = int(call.data.split(":")[1])
-    except Exception:
-        await call.answer("User ID topilmadi.", show_alert=True)
+    user_id = await _claim_receipt(call, REJECTED)
+    if user_id is None:
         return
     key = StorageKey(bot_id=bot.id, chat_id=user_id, user_id=user_id)
     await dp.storage.clear_state(key)
     await bot.send_message(user_id, "❌ Chekingiz rad etildi. Qayta urinib ko‘ring.")
-    with contextlib.suppress(Exception):
-        await call.message.edit_reply_markup()
     await call.answer("❌ Rad etildi")
+    if lobbies.enabled:
+        await _announce_promotions(lobbies.release(user_id))
+
+@dp.message(Command("lobbies"))
+async def cmd_lobbies(message: Message):
+    if message.from_user.id not in ADMINS:
+        return
+    if not lobbies.enabled:
+        await message.answer("🎫 Lobbi cheklovi o‘chirilgan (LOBBY_COUNT=0).")
+        return
+    stats = lobbies.stats()
+    per_lobby = "\n".join(f"  #{lobby}: {taken}/{LOBBY_SIZE}" for lobby, taken in stats.pop("per_lobby").items())
+    await message.answer("🎫 Lobbilar:\n" + "\n".join(f"{k}: {v}" for k, v in stats.items()) + "\n" + per_lobby)
+
+@dp.message(Command("sendstats"))
+async def cmd_sendstats(message: Message):
+    if message.from_user.id not in ADMINS:
+        return
+    lines = [f"{name}: " + ", ".join(f"{k}={v}" for k, v in stats.items())
+             for name, stats in sender.stats().items()]
+    await message.answer("📤 Bot API:\n" + ("\n".join(lines) or "hali so‘rov yo‘q"))
+
+@dp.message(Command("broadcast"))
+async def cmd_broadcast(message: Message, command: CommandObject):
+    """
+    /broadcast <matn> — or reply to any message with /broadcast to copy it to every participant.
+    """
+    if message.from_user.id not in ADMINS:
+        return
+    reply = message.reply_to_message
+    if not reply and not command.args:
+        await message.answer("Foydalanish: /broadcast <matn> yoki xabarga javob sifatida /broadcast")
+        return
+    user_ids = registrations.user_ids()
+    if reply:
+        job_id, total = broadcasts.create(message.chat.id, user_ids,
+                                          from_chat_id=reply.chat.id, message_id=reply.message_id)
+    else:
+        job_id, total = broadcasts.create(message.chat.id, user_ids, text=command.args)
+    broadcasts.start(job_id)
+    await message.answer(f"📣 Xabar #{job_id} {total} ta qatnashchiga yuborilmoqda...")
+
+@dp.message(Command("import_results"))
+async def cmd_import_results(message: Message, command: CommandObject):
+    """
+    Bulk import of one match: send a CSV file with caption "/import_results <o‘yin nomi>",
+    or "/import_results <o‘yin nomi> | <A1 oraliq>" to read it from the spreadsheet.
+    Columns: pubg_id, kills, placement[, nickname].
+    """
+    if message.from_user.id not in ADMINS:
+        return
+    name, _, a1_range = (command.args or "").partition("|")
+    name, a1_range = name.strip(), a1_range.strip()
+    if not name or (not message.document and not a1_range):
+        await message.answer(
+            "Foydalanish:\n"
+            "• CSV fayl, izoh: /import_results <o‘yin nomi>\n"
+            "• /import_results <o‘yin nomi> | Natijalar!A2:D100\n"
+            "Ustunlar: pubg_id, kills, placement[, nickname]"
+        )
+        return
+    try:
+        if message.document:
+            if (message.document.file_size or 0) > RESULTS_CSV_MAX_BYTES:
+                await message.answer("⚠️ Fayl juda katta.")
+                return
+            content = await bot.download(message.document)
+            rows, errors = parse_csv(content.read())
+        else:
+            rows, errors = parse_result_rows(await sheets.get_range(a1_range))
+    except Exception:
+        logger.exception("import_results: reading results failed")
+        await message.answer("⚠️ Natijalarni o‘qishda xatolik yuz berdi.")
+        return
+    if not rows:
+        await message.answer("⚠️ Natija topilmadi." + ("\n" + "\n".join(errors[:10]) if errors else ""))
+        return
+    result = matches.import_match(name, rows)
+    for st in result.affected:
+        standings.set_results(st.pubg_id, st.pubg_id, st.points, st.placement_points, st.kills, st.wins,
+                              st.matches, st.best_placement, nickname=st.nickname)
+    for pubg_id in result.removed:
+        if registrations.find_by_pubg_id(pubg_id) is not None:
+            standings.set_results(pubg_id, pubg_id, 0, 0, 0, 0, 0, None)
+        else:
+            standings.remove(pubg_id)
+    errors += result.errors
+    text = f"✅ «{html.escape(name)}»: {result.rows} ta natija saqlandi."
+    if errors:
+        text += f"\n⚠️ {len(errors)} ta qator o‘tkazib yuborildi:\n" + "\n".join(html.escape(e) for e in errors[:10])
+    await message.answer(text)
+
+@dp.message(Command("queue"))
+async def cmd_queue(message: Message):
+    if message.from_user.id not in ADMINS:
+        return
+    stats = reviews.stats()
+    per_admin = "\n".join(f"  {admin_id}: {count}" for admin_id, count in stats.pop("pending_by_admin").items())
+    await message.answer(
+        "🧾 Cheklar navbati:\n" + "\n".join(f"{k}: {v}" for k, v in stats.items()) +
+        "\nAdminlar bo‘yicha:\n" + per_admin
+    )
+
+webhook_server: Optional[WebhookServer] = None
+
+def _metrics_gauges() -> dict:
+    sub = subscriptions.stats()
+    gauges = {
+        "uptime_seconds": round(time.time() - metrics.started),
+        "registrations": registrations.count(),
+        "sheet_dirty_rows": registrations.dirty_count(),
+        "standings_players": len(standings),
+        "scheduler_pending": scheduler.pending(),
+        "outbound_waiting": sender.global_bucket.waiting(),
+        "throttle_tracked_keys": throttle.stats()["tracked_keys"],
+        "subscription_cache_size": sub["size"],
+        "subscription_cache_hits": sub["hits"],
+        "subscription_check_errors": sub["errors"],
+        "receipts_pending": reviews.stats()["pending"],
+        "receipts_indexed": len(receipt_index),
+    }
+    if card_renderer is not None:
+        card_stats = card_renderer.stats()
+        gauges.update(leaderboard_cards_cached=card_stats["cached_cards"], leaderboard_card_hits=card_stats["hits"],
+                      leaderboard_card_renders=card_stats["renders"], leaderboard_card_declined=card_stats["declined"])
+    if lobbies.enabled:
+        lobby_stats = lobbies.stats()
+        gauges.update(lobby_seats_taken=lobby_stats["taken"], lobby_seats_held=lobby_stats["held"],
+                      lobby_waitlist=lobby_stats["waitlist"])
+    if webhook_server is not None:
+        gauges["webhook_queue_depth"] = webhook_server.queue_depth()
+    return gauges
+
+@dp.message(Command("stats"))
+async def cmd_stats(message: Message):
+    """
+    Admin-only: gauges plus latency histograms per handler / Bot API method / Sheets call.
+    """
+    if message.from_user.id not in ADMINS:
+        return
+    throttled = throttle.stats()
+    lines = ["📈 Statistika:"]
+    lines += [f"{k}: {v}" for k, v in _metrics_gauges().items()]
+    lines.append(f"throttled: {throttled['throttled']}, debounced: {throttled['debounced']}")
+    lines.append("receipt duplicates: " + ", ".join(f"{k}={v}" for k, v in receipt_index.stats().items()))
+    if card_renderer is not None:
+        lines.append("leaderboard cards: " + ", ".join(f"{k}={v}" for k, v in card_renderer.stats().items()))
+    lines.append("startup (ms): " + ", ".join(f"{k}={v}" for k, v in startup_timings.items()))
+    lines.append("\n⏱ Kechikish (ms):")
+    lines += metrics.summary() or ["hali ma'lumot yo‘q"]
+    text = html.escape("\n".join(lines))
+    if len(text) > 4000:
+        text = text[:4000] + "\n…"
+    await message.answer(text)
 
 # ----------------------------
 # PUBG INFO HANDLER
@@ -487,39 +1141,122 @@ async def handle_pubg_info(message: Message, state: FSMContext):
     if len(tokens) >= 2:
         pubg_id = tokens[-1]
         pubg_nick = " ".join(tokens[:-1])
-    ok = append_to_sheet(pubg_nick or message.from_user.full_name, pubg_id or "ID not provided")
+    existing = registrations.find_by_pubg_id(pubg_id)
+    if existing is not None:
+        if existing.user_id == message.from_user.id:
+            # same player again: just refresh the nickname
+            registrations.update(existing.id, pubg_nick or existing.nickname, pubg_id)
+            sheet_sync.nudge()
+            standings.set_player(pubg_id, pubg_id, pubg_nick or existing.nickname, existing.id)
+            await message.answer("ℹ️ Siz bu PUBG ID bilan allaqachon ro‘yxatdan o‘tgansiz. Ma'lumot yangilandi.",
+                                 reply_markup=reply_social_menu)
+            await state.clear()
+        else:
+            # keep the state so the user can send the correct ID
+            await message.answer("⚠️ Bu PUBG ID boshqa foydalanuvchi tomonidan ro‘yxatdan o‘tkazilgan. "
+                                 "ID'ni tekshirib, qayta yuboring yoki admin bilan bog‘laning.")
+        return
+    ok = append_to_sheet(pubg_nick or message.from_user.full_name, pubg_id or NO_PUBG_ID,
+                         user_id=message.from_user.id)
     if ok:
-        await message.answer("📋 Ma'lumot qabul qilindi. Reytingga qoʻshildi. Rahmat!", reply_markup=reply_social_menu)
+        await message.answer("📋 Ma'lumot qabul qilindi. Tez orada reytingga qoʻshiladi.", reply_markup=reply_social_menu)
     else:
         await message.answer("⚠️ Reytingga qoʻshishda xatolik yuz berdi. Admin bilan bog‘laning.", reply_markup=reply_social_menu)
     try:
         if ADMINS:
-            await bot.send_message(ADMINS[0],
-                                   f"🆕 Yangi qatnashchi: {message.from_user.full_name}\nPUBG: {pubg_nick} | ID: {pubg_id}\nUser ID: {message.from_user.id}")
-    except Exception:
-        pass
+            with outbound.priority(NOTIFICATION):
+                await bot.send_message(ADMINS[0],
+                                       f"🆕 Yangi qatnashchi: {message.from_user.full_name}\nPUBG: {pubg_nick} | ID: {pubg_id}\nUser ID: {message.from_user.id}")
+    except Exception as e:
+        logger.warning("Admin notification about new participant failed: %s", e)
     await state.clear()
 
 # ----------------------------
 # MAIN
 # ----------------------------
-async def main():
-    logger.info("Bot ishga tushmoqda...")
-    # Try to pre-connect Google Sheets (optional)
+_warmup_task: Optional[asyncio.Task] = None
+_main_started = 0.0
+
+async def _warm_sheets():
+    """
+    Connects to Google Sheets in the background so updates are served meanwhile.
+    """
     try:
-        connect_to_sheet()
+        with startup_phase("sheets_connect"):
+            await sheets.worksheet()
     except FileNotFoundError as e:
         logger.info("Google Sheets credentials not found (expected if not uploaded): %s", e)
         logger.info("Set SHEET_JSON (file) or SHEET_JSON_DATA / SHEET_JSON_B64 env vars.")
     except Exception:
-        logger.info("Google Sheetsga avtomatik ulanishda muammo yuz berdi — ishlash davom etadi, ammo /reyting va append funksiyalari xatolik beradi.")
+        logger.info("Google Sheetsga avtomatik ulanishda muammo yuz berdi — ishlash davom etadi, ro'yxatlar jadvalga keyinroq yoziladi.")
+
+@dp.startup()
+async def on_startup():
+    global _warmup_task
+    if card_renderer is not None:
+        # fork the render processes first, while this process has as few threads as possible
+        with startup_phase("card_workers"):
+            await card_renderer.start()
+    with startup_phase("standings"):
+        rebuild_standings()
+    _warmup_task = asyncio.create_task(_warm_sheets())
+    sheet_sync.start()
+    broadcasts.resume()
+    _schedule_hold_expiry()  # holds left from before a restart
+    if _main_started:
+        startup_timings["until_serving"] = round((time.perf_counter() - _main_started) * 1000, 1)
+        logger.info("Startup: serving updates %.1f ms after main() started", startup_timings["until_serving"])
 
-    # Warn about possible polling conflicts
-    logger.info("Eslatma: Agar botni lokalda ham ishga tushirgan bo'lsangiz, avval uni to'xtating. Aks holda TelegramConflictError bo'lishi mumkin.")
+@dp.shutdown()
+async def on_shutdown():
+    if _warmup_task is not None:
+        _warmup_task.cancel()
+    await broadcasts.stop()
+    await sheet_sync.stop()
+    await scheduler.stop()
+    registrations.close()
+    matches.close()
+    receipt_index.close()
+    lobbies.close()
+    reviews.close()
+    if card_renderer is not None:
+        card_renderer.close()
+    sheets.close()
 
+async def main():
+    global webhook_server, _main_started
+    _main_started = time.perf_counter()
+    logger.info("Bot ishga tushmoqda... (rejim: %s)", BOT_MODE)
+    if not BOT_TOKEN:
+        raise RuntimeError("BOT_TOKEN is not set. Put it into .env as BOT_TOKEN=your_token")
+    with startup_phase("bot"):
+        create_bot(BOT_TOKEN)
+    metrics_endpoint = metrics_handler(metrics, _metrics_gauges, token=METRICS_TOKEN)
+    metrics_runner = None
     try:
-        await dp.start_polling(bot)
+        if BOT_MODE == "webhook":
+            if not WEBHOOK_BASE_URL:
+                raise RuntimeError("BOT_MODE=webhook requires WEBHOOK_BASE_URL")
+            if METRICS_PATH and not METRICS_TOKEN:
+                # the webhook server is public
+                logger.warning("METRICS_PATH is set but METRICS_TOKEN is not; metrics endpoint not served")
+            webhook_server = WebhookServer(dp, bot, WEBHOOK_PATH, WEBHOOK_SECRET,
+                                           queue_size=WEBHOOK_QUEUE_SIZE, workers=WEBHOOK_WORKERS,
+                                           extra_routes={METRICS_PATH: metrics_endpoint}
+                                           if METRICS_PATH and METRICS_TOKEN else None)
+            await run_webhook(webhook_server, WEBHOOK_BASE_URL, WEB_HOST, WEB_PORT)
+        else:
+            if METRICS_PORT and METRICS_PATH:
+                metrics_runner = await start_metrics_server(metrics_endpoint, WEB_HOST, METRICS_PORT, METRICS_PATH)
+            # Warn about possible polling conflicts
+            logger.info("Eslatma: Agar botni lokalda ham ishga tushirgan bo'lsangiz, avval uni to'xtating. Aks holda TelegramConflictError bo'lishi mumkin.")
+            # a webhook left over from webhook mode would block getUpdates
+            with startup_phase("delete_webhook"):
+                await bot.delete_webhook(drop_pending_updates=False)
+            await dp.start_polling(bot)
     finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
         await bot.session.close()
         logger.info("Bot to‘xtatildi.")
 
@@ -0,0 +1,255 @@
+# matches.py
+"""
+Match results and per-player history.
+
+Admins import the results of a match in bulk (CSV file or a sheet range, one
+row per player: pubg_id, kills, placement[, nickname]). Every row goes into
+`match_results`, indexed by player, and the player's running totals in
+`player_stats` are updated in the same transaction. A player's page is then
+one primary-key read for the totals plus one indexed LIMIT/OFFSET query for
+the visible matches, however many matches exist.
+
+Re-importing a match with the same name replaces it; only the totals of the
+players in that match are recomputed.
+"""
+
+import csv
+import io
+import logging
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import db
+
+logger = logging.getLogger(__name__)
+
+# placement -> points (PUBG Mobile esports table); every kill is worth KILL_POINTS
+PLACEMENT_POINTS: Dict[int, int] = {1: 10, 2: 6, 3: 5, 4: 4, 5: 3, 6: 2, 7: 1, 8: 1}
+KILL_POINTS = 1
+
+
+def match_points(kills: int, placement: int) -> Tuple[int, int]:
+    """
+    Returns (total points, placement points) for one match.
+    """
+    placement_points = PLACEMENT_POINTS.get(placement, 0)
+    return kills * KILL_POINTS + placement_points, placement_points
+
+
+class ResultRow(NamedTuple):
+    pubg_id: str
+    kills: int
+    placement: int
+    nickname: str
+
+
+class PlayerStats(NamedTuple):
+    pubg_id: str
+    nickname: str
+    matches: int
+    kills: int
+    points: int
+    placement_points: int
+    wins: int
+    best_placement: Optional[int]
+
+
+class MatchEntry(NamedTuple):
+    match_id: int
+    name: str
+    played_at: float
+    kills: int
+    placement: int
+    points: int
+
+
+class ImportResult(NamedTuple):
+    match_id: int
+    rows: int
+    errors: List[str]
+    affected: List[PlayerStats]
+    removed: List[str]  # players left without any match after a re-import
+
+
+def parse_result_rows(rows: Iterable[Sequence[str]]) -> Tuple[List[ResultRow], List[str]]:
+    """
+    Parses "pubg_id, kills, placement[, nickname]" rows. A header row and blank
+    rows are skipped; bad rows are reported, not fatal.
+    """
+    parsed: List[ResultRow] = []
+    errors: List[str] = []
+    for line_no, row in enumerate(rows, start=1):
+        cells = [c.strip() for c in row]
+        if not any(cells):
+            continue
+        if len(cells) < 3:
+            errors.append(f"{line_no}: 3 ta ustun kerak")
+            continue
+        try:
+            kills, placement = int(cells[1]), int(cells[2])
+        except ValueError:
+            if line_no == 1:
+                continue  # header
+            errors.append(f"{line_no}: kill/o‘rin son emas")
+            continue
+        if kills < 0 or placement < 1:
+            errors.append(f"{line_no}: noto‘g‘ri qiymat")
+            continue
+        parsed.append(ResultRow(cells[0], kills, placement, cells[3] if len(cells) > 3 else ""))
+    return parsed, errors
+
+
+def parse_csv(content: bytes) -> Tuple[List[ResultRow], List[str]]:
+    text = content.decode("utf-8-sig")
+    # Excel exports use ";" in many locales; pick whichever separator the first line uses most
+    first_line = text.split("\n", 1)[0]
+    delimiter = max(",;\t", key=first_line.count)
+    return parse_result_rows(csv.reader(io.StringIO(text), delimiter=delimiter))
+
+
+class MatchStore:
+    def __init__(self, db_path: str, tournament: str):
+        self.tournament = tournament
+        self._conn = db.connect(db_path)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS matches ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " tournament TEXT NOT NULL,"
+            " name TEXT NOT NULL,"
+            " played_at REAL NOT NULL,"
+            " UNIQUE (tournament, name));"
+            "CREATE TABLE IF NOT EXISTS match_results ("
+            " match_id INTEGER NOT NULL,"
+            " pubg_id TEXT NOT NULL,"
+            " kills INTEGER NOT NULL,"
+            " placement INTEGER NOT NULL,"
+            " points INTEGER NOT NULL,"
+            " PRIMARY KEY (match_id, pubg_id));"
+            "CREATE INDEX IF NOT EXISTS ix_results_player ON match_results (pubg_id, match_id DESC);"
+            "CREATE TABLE IF NOT EXISTS player_stats ("
+            " tournament TEXT NOT NULL,"
+            " pubg_id TEXT NOT NULL,"
+            " nickname TEXT NOT NULL DEFAULT '',"
+            " matches INTEGER NOT NULL DEFAULT 0,"
+            " kills INTEGER NOT NULL DEFAULT 0,"
+            " points INTEGER NOT NULL DEFAULT 0,"
+            " placement_points INTEGER NOT NULL DEFAULT 0,"
+            " wins INTEGER NOT NULL DEFAULT 0,"
+            " best_placement INTEGER,"
+            " PRIMARY KEY (tournament, pubg_id));"
+        )
+
+    def import_match(self, name: str, results: Sequence[ResultRow]) -> ImportResult:
+        """
+        Stores one match and updates the totals of its players atomically.
+        """
+        errors: List[str] = []
+        seen = set()
+        unique: List[ResultRow] = []
+        for row in results:
+            if row.pubg_id in seen:
+                errors.append(f"{row.pubg_id}: takrorlangan")
+                continue
+            seen.add(row.pubg_id)
+            unique.append(row)
+        with self._conn:
+            old = self._conn.execute(
+                "SELECT id FROM matches WHERE tournament = ? AND name = ?", (self.tournament, name)).fetchone()
+            replaced: List[str] = []
+            if old:
+                replaced = [r[0] for r in self._conn.execute(
+                    "SELECT pubg_id FROM match_results WHERE match_id = ?", (old[0],))]
+                self._conn.execute("DELETE FROM match_results WHERE match_id = ?", (old[0],))
+                self._conn.execute("DELETE FROM matches WHERE id = ?", (old[0],))
+            match_id = self._conn.execute(
+                "INSERT INTO matches (tournament, name, played_at) VALUES (?, ?, ?)",
+                (self.tournament, name, time.time())).lastrowid
+            self._conn.executemany(
+                "INSERT INTO match_results (match_id, pubg_id, kills, placement, points) VALUES (?, ?, ?, ?, ?)",
+                [(match_id, r.pubg_id, r.kills, r.placement, match_points(r.kills, r.placement)[0]) for r in unique],
+            )
+            if old:
+                # totals can't be "un-added" for best_placement; recompute just these players
+                self._recompute(set(replaced) | seen, {r.pubg_id: r.nickname for r in unique if r.nickname})
+            else:
+                self._conn.executemany(
+                    "INSERT INTO player_stats"
+                    " (tournament, pubg_id, nickname, matches, kills, points, placement_points, wins, best_placement)"
+                    " VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT (tournament, pubg_id) DO UPDATE SET"
+                    "  nickname = CASE WHEN excluded.nickname != '' THEN excluded.nickname ELSE nickname END,"
+                    "  matches = matches + 1,"
+                    "  kills = kills + excluded.kills,"
+                    "  points = points + excluded.points,"
+                    "  placement_points = placement_points + excluded.placement_points,"
+                    "  wins = wins + excluded.wins,"
+                    "  best_placement = MIN(COALESCE(best_placement, excluded.best_placement), excluded.best_placement)",
+                    [(self.tournament, r.pubg_id, r.nickname, r.kills, *match_points(r.kills, r.placement),
+                      int(r.placement == 1), r.placement) for r in unique],
+                )
+        touched = sorted(seen | set(replaced))
+        affected = self.stats_for(touched)
+        still_ranked = {s.pubg_id for s in affected}
+        logger.info("Match '%s' imported: %d result(s)", name, len(unique))
+        return ImportResult(match_id, len(unique), errors, affected, [p for p in touched if p not in still_ranked])
+
+    def _recompute(self, pubg_ids: Iterable[str], nicknames: Dict[str, str]):
+        placement_case = "CASE r.placement " + " ".join(
+            f"WHEN {place} THEN {points}" for place, points in PLACEMENT_POINTS.items()) + " ELSE 0 END"
+        for pubg_id in pubg_ids:
+            matches, kills, points, placement_points, wins, best = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(r.kills), 0), COALESCE(SUM(r.points), 0),"
+                f" COALESCE(SUM({placement_case}), 0), COALESCE(SUM(r.placement = 1), 0), MIN(r.placement)"
+                " FROM match_results r JOIN matches m ON m.id = r.match_id"
+                " WHERE r.pubg_id = ? AND m.tournament = ?", (pubg_id, self.tournament)).fetchone()
+            if not matches:
+                self._conn.execute("DELETE FROM player_stats WHERE tournament = ? AND pubg_id = ?",
+                                   (self.tournament, pubg_id))
+                continue
+            self._conn.execute(
+                "INSERT INTO player_stats"
+                " (tournament, pubg_id, matches, kills, points, placement_points, wins, best_placement)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (tournament, pubg_id) DO UPDATE SET matches = excluded.matches,"
+                "  kills = excluded.kills, points = excluded.points, placement_points = excluded.placement_points,"
+                "  wins = excluded.wins, best_placement = excluded.best_placement",
+                (self.tournament, pubg_id, matches, kills, points, placement_points, wins, best),
+            )
+        self._conn.executemany(
+            "UPDATE player_stats SET nickname = ? WHERE tournament = ? AND pubg_id = ?",
+            [(nickname, self.tournament, pubg_id) for pubg_id, nickname in nicknames.items()],
+        )
+
+    def stats_for(self, pubg_ids: Sequence[str]) -> List[PlayerStats]:
+        if not pubg_ids:
+            return []
+        marks = ",".join("?" * len(pubg_ids))
+        rows = self._conn.execute(
+            "SELECT pubg_id, nickname, matches, kills, points, placement_points, wins, best_placement"
+            f" FROM player_stats WHERE tournament = ? AND pubg_id IN ({marks})",
+            (self.tournament, *pubg_ids)).fetchall()
+        return [PlayerStats(*row) for row in rows]
+
+    def all_stats(self) -> List[PlayerStats]:
+        rows = self._conn.execute(
+            "SELECT pubg_id, nickname, matches, kills, points, placement_points, wins, best_placement"
+            " FROM player_stats WHERE tournament = ?", (self.tournament,)).fetchall()
+        return [PlayerStats(*row) for row in rows]
+
+    def history(self, pubg_ids: Sequence[str], limit: int, offset: int = 0) -> List[MatchEntry]:
+        """
+        Newest matches first for the given player IDs (one indexed query).
+        """
+        if not pubg_ids:
+            return []
+        marks = ",".join("?" * len(pubg_ids))
+        rows = self._conn.execute(
+            "SELECT m.id, m.name, m.played_at, r.kills, r.placement, r.points"
+            " FROM match_results r JOIN matches m ON m.id = r.match_id"
+            f" WHERE r.pubg_id IN ({marks}) AND m.tournament = ?"
+            " ORDER BY r.match_id DESC LIMIT ? OFFSET ?",
+            (*pubg_ids, self.tournament, limit, offset)).fetchall()
+        return [MatchEntry(*row) for row in rows]
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,200 @@
+# metrics.py
+"""
+In-process metrics for handlers and external calls.
+
+Everything is recorded into fixed-bucket histograms (one list of ints per
+series), so an observation is a perf_counter pair and a bisect over ~15
+bucket bounds: cheap enough to stay on in production. Series are keyed by
+(kind, name), e.g. ("handler", "cmd_reyting"), ("bot_api", "sendMessage"),
+("sheets", "append_rows").
+
+- HandlerMetrics: inner middleware on dp.message / dp.callback_query, timing
+  each handler by its function name.
+- BotApiMetrics: request middleware (`bot.session.middleware`), timing every
+  Bot API request attempt.
+- SheetsGateway takes the registry and times each blocking call itself.
+
+`Metrics.summary()` feeds the admin /stats command; `prometheus_text()` and
+`metrics_handler()` expose the same data in the Prometheus text format.
+"""
+
+import bisect
+import contextlib
+import hmac
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from aiohttp import web
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from aiogram.types import TelegramObject
+
+# upper bounds in seconds; the last bucket is +Inf
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+SeriesKey = Tuple[str, str]
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count", "errors", "in_flight")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.errors = 0
+        self.in_flight = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q-th observation (seconds); inf if it is in the last bucket.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    def __init__(self):
+        self.series: Dict[SeriesKey, Histogram] = {}
+        self.started = time.time()
+
+    def get(self, kind: str, name: str) -> Histogram:
+        key = (kind, name)
+        hist = self.series.get(key)
+        if hist is None:
+            hist = self.series[key] = Histogram()
+        return hist
+
+    def error(self, kind: str, name: str):
+        """
+        Counts a failure that was handled without raising (e.g. a logged save error).
+        """
+        self.get(kind, name).errors += 1
+
+    @contextlib.contextmanager
+    def timer(self, kind: str, name: str):
+        hist = self.get(kind, name)
+        hist.in_flight += 1
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            hist.errors += 1
+            raise
+        finally:
+            hist.in_flight -= 1
+            hist.observe(time.perf_counter() - started)
+
+    def summary(self, kind: str = "") -> List[str]:
+        """
+        One line per series: count, errors, in-flight, avg/p50/p95/p99 in ms.
+        """
+        def ms(seconds: float) -> str:
+            return ">30s" if seconds == float("inf") else f"{seconds * 1000:.0f}"
+
+        lines = []
+        for (k, name), h in sorted(self.series.items()):
+            if kind and k != kind:
+                continue
+            avg = h.total / h.count if h.count else 0.0
+            lines.append(
+                f"{k}/{name}: n={h.count} err={h.errors} now={h.in_flight} "
+                f"avg={avg * 1000:.0f} p50≤{ms(h.quantile(0.5))} p95≤{ms(h.quantile(0.95))} "
+                f"p99≤{ms(h.quantile(0.99))}ms"
+            )
+        return lines
+
+    def prometheus_text(self, gauges: Dict[str, float] = None) -> str:
+        out = [
+            "# TYPE bot_call_duration_seconds histogram",
+        ]
+        for (kind, name), h in sorted(self.series.items()):
+            labels = f'kind="{kind}",name="{name}"'
+            cumulative = 0
+            for bound, n in zip(BUCKETS, h.counts):
+                cumulative += n
+                out.append(f'bot_call_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            out.append(f'bot_call_duration_seconds_bucket{{{labels},le="+Inf"}} {h.count}')
+            out.append(f"bot_call_duration_seconds_sum{{{labels}}} {h.total:.6f}")
+            out.append(f"bot_call_duration_seconds_count{{{labels}}} {h.count}")
+        out.append("# TYPE bot_call_errors_total counter")
+        out.extend(f'bot_call_errors_total{{kind="{k}",name="{n}"}} {h.errors}'
+                   for (k, n), h in sorted(self.series.items()))
+        out.append("# TYPE bot_calls_in_flight gauge")
+        out.extend(f'bot_calls_in_flight{{kind="{k}",name="{n}"}} {h.in_flight}'
+                   for (k, n), h in sorted(self.series.items()))
+        for name, value in (gauges or {}).items():
+            out.append(f"# TYPE bot_{name} gauge")
+            out.append(f"bot_{name} {value}")
+        return "\n".join(out) + "\n"
+
+
+class HandlerMetrics(BaseMiddleware):
+    """
+    Inner middleware: runs after filters matched, so `data["handler"]` is the handler about to run.
+    """
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_obj = data.get("handler")
+        name = getattr(getattr(handler_obj, "callback", None), "__name__", "unknown")
+        with self.metrics.timer("handler", name):
+            return await handler(event, data)
+
+
+class BotApiMetrics(BaseRequestMiddleware):
+    """
+    Register after OutboundScheduler so each request attempt is timed without the pacing wait.
+    """
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    async def __call__(self, make_request: NextRequestMiddlewareType[TelegramType], bot: Bot,
+                       method: TelegramMethod[TelegramType]) -> Response[TelegramType]:
+        with self.metrics.timer("bot_api", method.__api_method__):
+            return await make_request(bot, method)
+
+
+def metrics_handler(metrics: Metrics, gauges: Callable[[], Dict[str, float]] = dict, token: str = ""):
+    """
+    aiohttp GET handler serving the Prometheus text format; with `token`, requires "Authorization: Bearer <token>".
+    """
+    async def handle(request: web.Request) -> web.Response:
+        if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            return web.Response(status=401)
+        return web.Response(text=metrics.prometheus_text(gauges()), content_type="text/plain", charset="utf-8")
+    return handle
+
+
+async def start_metrics_server(handler, host: str, port: int, path: str = "/metrics") -> web.AppRunner:
+    """
+    Serves only the metrics endpoint (polling mode has no web server of its own).
+    """
+    app = web.Application()
+    app.router.add_get(path, handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    return runner
@@ -0,0 +1,196 @@
+# outbound.py
+"""
+Rate-limited outbound Bot API calls.
+
+OutboundScheduler is an aiogram request middleware (`bot.session.middleware`),
+so every send/edit/copy/forward call goes through it, including
+`message.answer()`. It paces sends with a global token bucket (~30 msg/s) and
+a per-chat limit (~1 msg/s with a small burst), retries on RetryAfter, and
+records per-method latency and failure counters.
+
+When the global bucket is empty, waiting calls are released in priority
+order: interactive replies first, then admin notifications, then bulk sends.
+Handlers pick a lower priority with `with outbound.priority(NOTIFICATION):`.
+"""
+
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+NOTIFICATION = 1
+BULK = 2
+
+_priority: ContextVar[int] = ContextVar("outbound_priority", default=INTERACTIVE)
+
+# API methods that count toward Telegram's flood limits
+RATE_LIMITED_PREFIXES = ("send", "copy", "forward", "edit")
+
+
+@contextlib.contextmanager
+def priority(level: int):
+    """
+    Sets the priority of Bot API calls made inside the block (in this task).
+    """
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class PriorityTokenBucket:
+    """
+    Token bucket whose waiters are served lowest `priority` value first, FIFO within a priority.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._pump: Optional[asyncio.Task] = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, priority_level: int = INTERACTIVE):
+        self._refill()
+        if not self._waiters and self._tokens >= 1:
+            self._tokens -= 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority_level, next(self._seq), fut))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run())
+        await fut
+
+    async def _run(self):
+        while self._waiters:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+            _, _, fut = heapq.heappop(self._waiters)
+            if fut.done():  # caller was cancelled
+                continue
+            self._tokens -= 1
+            fut.set_result(None)
+
+
+class ChatPacer:
+    """
+    Per-chat GCRA limiter: `rate` sends per second with `burst` sends allowed back to back.
+    Keeps one float per recently active chat; idle chats are pruned.
+    """
+
+    def __init__(self, rate: float, burst: int, max_chats: int = 100_000):
+        self.interval = 1.0 / rate
+        self.tolerance = self.interval * (burst - 1)
+        self.max_chats = max_chats
+        self._tat: Dict[int, float] = {}  # chat_id -> theoretical arrival time
+
+    def reserve(self, chat_id: int) -> float:
+        """
+        Reserves the next slot for `chat_id`; returns how long to wait for it.
+        """
+        now = time.monotonic()
+        tat = max(self._tat.get(chat_id, now), now)
+        self._tat[chat_id] = tat + self.interval
+        if len(self._tat) > self.max_chats:
+            self._tat = {c: t for c, t in self._tat.items() if t > now}
+        return max(0.0, tat - self.tolerance - now)
+
+
+class MethodStats:
+    __slots__ = ("calls", "failures", "retries", "latency_total", "latency_max", "wait_total")
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.wait_total = 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retries,
+            "avg_ms": round(self.latency_total / self.calls * 1000, 1) if self.calls else 0.0,
+            "max_ms": round(self.latency_max * 1000, 1),
+            "avg_wait_ms": round(self.wait_total / self.calls * 1000, 1) if self.calls else 0.0,
+        }
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    def __init__(self, global_rate: float = 30.0, chat_rate: float = 1.0, chat_burst: int = 3,
+                 max_retries: int = 3):
+        self.global_bucket = PriorityTokenBucket(global_rate, burst=global_rate)
+        self.chats = ChatPacer(chat_rate, chat_burst)
+        self.max_retries = max_retries
+        self.methods: Dict[str, MethodStats] = {}
+
+    async def __call__(self, make_request: NextRequestMiddlewareType[TelegramType], bot: Bot,
+                       method: TelegramMethod[TelegramType]) -> Response[TelegramType]:
+        name = method.__api_method__
+        stats = self.methods.get(name)
+        if stats is None:
+            stats = self.methods[name] = MethodStats()
+        limited = name.startswith(RATE_LIMITED_PREFIXES)
+        chat_id = getattr(method, "chat_id", None)
+        attempt = 0
+        while True:
+            waited = time.monotonic()
+            if limited:
+                if isinstance(chat_id, int):
+                    delay = self.chats.reserve(chat_id)
+                    if delay:
+                        await asyncio.sleep(delay)
+                await self.global_bucket.acquire(_priority.get())
+            started = time.monotonic()
+            stats.wait_total += started - waited
+            try:
+                response = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                stats.retries += 1
+                if attempt >= self.max_retries:
+                    stats.failures += 1
+                    raise
+                attempt += 1
+                logger.warning("%s: flood control, retry in %ss (attempt %d)", name, e.retry_after, attempt)
+                await asyncio.sleep(e.retry_after)
+                continue
+            except Exception:
+                stats.failures += 1
+                raise
+            finally:
+                elapsed = time.monotonic() - started
+                stats.calls += 1
+                stats.latency_total += elapsed
+                stats.latency_max = max(stats.latency_max, elapsed)
+            return response
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {name: s.as_dict() for name, s in sorted(self.methods.items())}
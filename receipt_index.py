@@ -0,0 +1,156 @@
+# receipt_index.py
+"""
+Index of every payment receipt already submitted, to catch duplicates before
+they reach an admin.
+
+Two keys per receipt:
+- Telegram's `file_unique_id`: the same file forwarded or re-sent, by anyone,
+  has the same id. One dict lookup.
+- A 64-bit difference hash (dHash) of the image: catches the same screenshot
+  re-saved, recompressed or slightly cropped. Near matches are found with a
+  multi-index: the hash is split into `max_distance + 1` bands, and two hashes
+  within `max_distance` bits must agree exactly on at least one band, so only
+  receipts sharing a band value are compared bit by bit. With tens of
+  thousands of receipts that is a handful of popcounts per lookup.
+
+Hashing decodes the image, so it runs in a thread pool (Pillow releases the
+GIL while decoding and resizing); JPEGs are decoded at reduced size with
+`draft()`. Without Pillow only the `file_unique_id` check is done.
+"""
+
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional
+
+import db
+
+try:
+    from PIL import Image
+except ImportError:  # optional: exact-duplicate detection still works
+    Image = None
+
+HASH_BITS = 64
+
+
+def dhash(data: bytes) -> Optional[int]:
+    """
+    64-bit difference hash of an image (9x8 grayscale, left/right gradient). None if it can't be decoded.
+    """
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.draft("L", (64, 64))  # JPEG: let the decoder downscale, much cheaper than a full decode
+            small = img.convert("L").resize((9, 8), Image.BILINEAR)
+            pixels = list(small.getdata())
+    except Exception:
+        return None
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    if value in (0, (1 << HASH_BITS) - 1):
+        return None  # flat image: matches every other flat image, useless for comparison
+    return value
+
+
+def _to_signed(value: int) -> int:
+    # SQLite INTEGER is signed 64-bit
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+class ReceiptMatch(NamedTuple):
+    kind: str  # "exact" (same file) or "near" (similar image)
+    user_id: int
+    submitted_at: float
+    distance: int
+
+
+class _Entry(NamedTuple):
+    file_unique_id: str
+    user_id: int
+    phash: Optional[int]
+    submitted_at: float
+
+
+class ReceiptIndex:
+    def __init__(self, db_path: str, max_distance: int = 4, hash_workers: int = 2):
+        self.max_distance = max_distance
+        self._bands = max_distance + 1
+        self._band_bits = -(-HASH_BITS // self._bands)  # ceil
+        self._executor = ThreadPoolExecutor(max_workers=hash_workers, thread_name_prefix="receipt-hash")
+        self._conn = db.connect(db_path)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS receipt_index ("
+            " file_unique_id TEXT PRIMARY KEY,"
+            " user_id INTEGER NOT NULL,"
+            " phash INTEGER,"
+            " submitted_at REAL NOT NULL);"
+        )
+        self._by_file: Dict[str, _Entry] = {}
+        # one dict per band: band value -> entries whose hash has it
+        self._by_band: List[Dict[int, List[_Entry]]] = [{} for _ in range(self._bands)]
+        self.exact_hits = 0
+        self.near_hits = 0
+        for file_unique_id, user_id, phash, submitted_at in self._conn.execute(
+                "SELECT file_unique_id, user_id, phash, submitted_at FROM receipt_index ORDER BY submitted_at"):
+            self._remember(_Entry(file_unique_id, user_id, phash % (1 << 64) if phash is not None else None,
+                                  submitted_at))
+
+    def __len__(self) -> int:
+        return len(self._by_file)
+
+    def _band_values(self, phash: int):
+        mask = (1 << self._band_bits) - 1
+        return [(phash >> (i * self._band_bits)) & mask for i in range(self._bands)]
+
+    def _remember(self, entry: _Entry):
+        self._by_file[entry.file_unique_id] = entry
+        if entry.phash is not None:
+            for band, value in zip(self._by_band, self._band_values(entry.phash)):
+                band.setdefault(value, []).append(entry)
+
+    async def hash_image(self, data: bytes) -> Optional[int]:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, dhash, data)
+
+    def find(self, file_unique_id: str, phash: Optional[int] = None) -> Optional[ReceiptMatch]:
+        """
+        The earliest receipt with the same file, else the closest one within max_distance bits.
+        """
+        entry = self._by_file.get(file_unique_id)
+        if entry is not None:
+            self.exact_hits += 1
+            return ReceiptMatch("exact", entry.user_id, entry.submitted_at, 0)
+        if phash is None:
+            return None
+        best: Optional[_Entry] = None
+        best_distance = self.max_distance + 1
+        for band, value in zip(self._by_band, self._band_values(phash)):
+            for candidate in band.get(value, ()):
+                distance = bin(candidate.phash ^ phash).count("1")
+                if distance < best_distance:
+                    best, best_distance = candidate, distance
+        if best is None:
+            return None
+        self.near_hits += 1
+        return ReceiptMatch("near", best.user_id, best.submitted_at, best_distance)
+
+    def add(self, file_unique_id: str, user_id: int, phash: Optional[int]):
+        if file_unique_id in self._by_file:
+            return
+        entry = _Entry(file_unique_id, user_id, phash, time.time())
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO receipt_index (file_unique_id, user_id, phash, submitted_at) VALUES (?, ?, ?, ?)",
+                (file_unique_id, user_id, _to_signed(phash) if phash is not None else None, entry.submitted_at),
+            )
+        self._remember(entry)
+
+    def stats(self) -> Dict[str, int]:
+        return {"receipts": len(self._by_file), "exact_hits": self.exact_hits, "near_hits": self.near_hits}
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._conn.close()
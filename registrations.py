@@ -0,0 +1,280 @@
+# registrations.py
+"""
+Local-first registration store.
+
+SQLite is the bot's database for registrations; the Google worksheet is only a
+mirror kept up to date by SheetSync (sheet_sync.py). Every read (leaderboard,
+"my games", duplicate PUBG ID checks, broadcast recipients) is an indexed
+local query. Rows changed locally are flagged `dirty` until SheetSync has
+written them; rows edited by hand in the sheet come back in through
+`import_rows()`.
+
+Column D of the sheet holds the registration id, and imported rows are matched
+on it, so admins may sort the sheet or delete rows (a deleted row deletes the
+registration). Rows without an id (added by hand, or written before column D
+existed) are matched by content and get their id written back.
+"""
+
+import logging
+import time
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import db
+
+logger = logging.getLogger(__name__)
+
+NO_PUBG_ID = "ID not provided"
+
+
+class Registration(NamedTuple):
+    id: int
+    tournament: str
+    user_id: Optional[int]
+    nickname: str
+    pubg_id: str
+    created_at: float
+
+    def sheet_values(self) -> List[object]:
+        # column C keeps the Telegram user_id so participants can be reached (/broadcast);
+        # column D keeps the registration id so rows can be matched after sorting or deleting
+        return [self.nickname, self.pubg_id, self.user_id or "", self.id]
+
+
+_COLUMNS = "id, tournament, user_id, nickname, pubg_id, created_at"
+
+
+class RegistrationStore:
+    def __init__(self, db_path: str, tournament: str):
+        self.tournament = tournament
+        self._conn = db.connect(db_path)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS registrations ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " tournament TEXT NOT NULL,"
+            " user_id INTEGER,"
+            " nickname TEXT NOT NULL,"
+            " pubg_id TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " sheet_row INTEGER,"
+            " dirty INTEGER NOT NULL DEFAULT 1);"
+            "CREATE INDEX IF NOT EXISTS ix_reg_user ON registrations (user_id);"
+            "CREATE INDEX IF NOT EXISTS ix_reg_pubg ON registrations (tournament, pubg_id);"
+            "CREATE INDEX IF NOT EXISTS ix_reg_sheet_row ON registrations (tournament, sheet_row);"
+            "CREATE INDEX IF NOT EXISTS ix_reg_dirty ON registrations (dirty) WHERE dirty = 1;"
+        )
+
+    def _insert(self, user_id: Optional[int], nickname: str, pubg_id: str, sheet_row: Optional[int] = None,
+                dirty: bool = True) -> int:
+        now = time.time()
+        cur = self._conn.execute(
+            "INSERT INTO registrations (tournament, user_id, nickname, pubg_id, created_at, updated_at, sheet_row, dirty)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (self.tournament, user_id, nickname, pubg_id, now, now, sheet_row, int(dirty)),
+        )
+        return cur.lastrowid
+
+    # ----------------------------
+    # reads
+    # ----------------------------
+    def find_by_pubg_id(self, pubg_id: str) -> Optional[Registration]:
+        if not pubg_id or pubg_id == NO_PUBG_ID:
+            return None
+        row = self._conn.execute(
+            f"SELECT {_COLUMNS} FROM registrations WHERE tournament = ? AND pubg_id = ? LIMIT 1",
+            (self.tournament, pubg_id),
+        ).fetchone()
+        return Registration(*row) if row else None
+
+    def by_user(self, user_id: int) -> List[Registration]:
+        rows = self._conn.execute(
+            f"SELECT {_COLUMNS} FROM registrations WHERE user_id = ? ORDER BY id DESC", (user_id,)
+        ).fetchall()
+        return [Registration(*row) for row in rows]
+
+    def list(self, limit: int = 20, offset: int = 0) -> List[Registration]:
+        """
+        Registrations of the current tournament in sheet order; rows not yet
+        mirrored come last, in registration order.
+        """
+        rows = self._conn.execute(
+            f"SELECT {_COLUMNS} FROM registrations WHERE tournament = ?"
+            " ORDER BY sheet_row IS NULL, sheet_row, id LIMIT ? OFFSET ?",
+            (self.tournament, limit, offset),
+        ).fetchall()
+        return [Registration(*row) for row in rows]
+
+    def count(self) -> int:
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM registrations WHERE tournament = ?", (self.tournament,)).fetchone()[0]
+
+    def user_ids(self) -> List[int]:
+        return [row[0] for row in self._conn.execute(
+            "SELECT DISTINCT user_id FROM registrations WHERE tournament = ? AND user_id IS NOT NULL",
+            (self.tournament,))]
+
+    # ----------------------------
+    # writes
+    # ----------------------------
+    def add(self, user_id: Optional[int], nickname: str, pubg_id: str) -> Registration:
+        with self._conn:
+            reg_id = self._insert(user_id, nickname, pubg_id)
+        row = self._conn.execute(f"SELECT {_COLUMNS} FROM registrations WHERE id = ?", (reg_id,)).fetchone()
+        return Registration(*row)
+
+    def update(self, reg_id: int, nickname: str, pubg_id: str):
+        with self._conn:
+            self._conn.execute(
+                "UPDATE registrations SET nickname = ?, pubg_id = ?, updated_at = ?, dirty = 1 WHERE id = ?",
+                (nickname, pubg_id, time.time(), reg_id),
+            )
+
+    # ----------------------------
+    # sheet mirroring (used by SheetSync)
+    # ----------------------------
+    def dirty_count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM registrations WHERE dirty = 1").fetchone()[0]
+
+    def pending_appends(self, limit: int) -> List[Tuple[Registration, float]]:
+        """
+        Dirty rows never written to the sheet, with the updated_at snapshot to pass back to mark_*.
+        """
+        rows = self._conn.execute(
+            f"SELECT {_COLUMNS}, updated_at FROM registrations"
+            " WHERE dirty = 1 AND sheet_row IS NULL AND tournament = ? ORDER BY id LIMIT ?",
+            (self.tournament, limit),
+        ).fetchall()
+        return [(Registration(*row[:-1]), row[-1]) for row in rows]
+
+    def pending_updates(self, limit: int) -> List[Tuple[Registration, int, float]]:
+        """
+        Dirty rows that already have a sheet row: (registration, sheet_row, updated_at).
+        """
+        rows = self._conn.execute(
+            f"SELECT {_COLUMNS}, sheet_row, updated_at FROM registrations"
+            " WHERE dirty = 1 AND sheet_row IS NOT NULL AND tournament = ? ORDER BY sheet_row LIMIT ?",
+            (self.tournament, limit),
+        ).fetchall()
+        return [(Registration(*row[:-2]), row[-2], row[-1]) for row in rows]
+
+    def mark_synced(self, items: Sequence[Tuple[int, Optional[int], float]]):
+        """
+        items: (registration id, sheet_row or None to keep, updated_at snapshot).
+        A row changed again since the snapshot stays dirty.
+        """
+        with self._conn:
+            self._conn.executemany(
+                "UPDATE registrations SET sheet_row = COALESCE(?, sheet_row),"
+                " dirty = CASE WHEN updated_at = ? THEN 0 ELSE dirty END WHERE id = ?",
+                [(sheet_row, updated_at, reg_id) for reg_id, sheet_row, updated_at in items],
+            )
+
+    def import_rows(self, data: List[List[str]]) -> int:
+        """
+        Applies the worksheet (header row first) to the store, matching rows on
+        the registration id in column D: rows edited in the sheet overwrite clean
+        local rows, moved rows take their new row number, rows added by hand are
+        inserted and registrations whose row was deleted are deleted. Rows that
+        repeat a registration id or a registered PUBG ID are skipped.
+        Dirty local rows win over the sheet until they are pushed.
+        Returns the number of registrations changed.
+        """
+        known = {
+            reg_id: (sheet_row, nickname, pubg_id, user_id, dirty)
+            for reg_id, sheet_row, nickname, pubg_id, user_id, dirty in self._conn.execute(
+                "SELECT id, sheet_row, nickname, pubg_id, user_id, dirty FROM registrations"
+                " WHERE tournament = ? AND sheet_row IS NOT NULL", (self.tournament,))
+        }
+        rows = []
+        for index, values in enumerate(data[1:], start=2):
+            cells = [str(v).strip() for v in values[:4]] + [""] * (4 - len(values[:4]))
+            nickname, pubg_id, raw_uid, raw_id = cells
+            if not nickname and not pubg_id:
+                continue
+            rows.append((index, nickname, pubg_id, int(raw_uid) if raw_uid.isdigit() else None,
+                         int(raw_id) if raw_id.isdigit() else None))
+        matched = {}  # registration id -> (sheet_row, nickname, pubg_id, user_id, needs id written back)
+        unmatched = []
+        for row in rows:
+            index, nickname, pubg_id, user_id, reg_id = row
+            if reg_id in matched:
+                # a retried append that had succeeded, or a copy-pasted row
+                logger.warning("Sheet import: row %d repeats registration %d; skipped", index, reg_id)
+            elif reg_id in known:
+                matched[reg_id] = (index, nickname, pubg_id, user_id, False)
+            else:
+                unmatched.append(row)
+        # rows without a (usable) id: same content anywhere, else the same row number
+        by_content = {}
+        by_row = {}
+        for reg_id, (sheet_row, nickname, pubg_id, _uid, _dirty) in known.items():
+            if reg_id not in matched:
+                by_content.setdefault((nickname, pubg_id), []).append(reg_id)
+                by_row[sheet_row] = reg_id
+        leftover = []
+        for row in unmatched:
+            index, nickname, pubg_id, user_id, _ = row
+            candidates = [reg_id for reg_id in by_content.get((nickname, pubg_id), ()) if reg_id not in matched]
+            if candidates:
+                matched[candidates[0]] = (index, nickname, pubg_id, user_id, True)
+            else:
+                leftover.append(row)
+        new_rows = []
+        for row in leftover:
+            index, nickname, pubg_id, user_id, _ = row
+            reg_id = by_row.get(index)
+            if reg_id is not None and reg_id not in matched:
+                matched[reg_id] = (index, nickname, pubg_id, user_id, True)
+            else:
+                new_rows.append(row)
+        deleted = [reg_id for reg_id in known if reg_id not in matched]
+        if deleted and not matched:
+            # an empty or foreign sheet would otherwise wipe the store
+            logger.warning("Sheet import: no row matches a registration; not deleting %d registration(s)",
+                           len(deleted))
+            deleted = []
+
+        changed = 0
+        now = time.time()
+        with self._conn:
+            for reg_id, (index, nickname, pubg_id, user_id, write_id) in matched.items():
+                old_row, old_nick, old_pubg, old_uid, dirty = known[reg_id]
+                if user_id is None:
+                    user_id = old_uid  # rows from before column C existed
+                edited = not dirty and (old_nick, old_pubg, old_uid) != (nickname, pubg_id, user_id)
+                if edited:
+                    self._conn.execute(
+                        "UPDATE registrations SET nickname = ?, pubg_id = ?, user_id = ?, updated_at = ? WHERE id = ?",
+                        (nickname, pubg_id, user_id, now, reg_id),
+                    )
+                if old_row != index:
+                    self._conn.execute("UPDATE registrations SET sheet_row = ? WHERE id = ?", (index, reg_id))
+                if write_id:
+                    self._conn.execute("UPDATE registrations SET dirty = 1 WHERE id = ?", (reg_id,))
+                if edited or old_row != index:
+                    changed += 1
+            for index, nickname, pubg_id, user_id, sheet_id in new_rows:
+                # maybe a local row whose append result was lost: match it by id, else by content
+                orphan = self._conn.execute(
+                    "SELECT id FROM registrations WHERE tournament = ? AND sheet_row IS NULL"
+                    " AND (id = ? OR (nickname = ? AND pubg_id = ? AND user_id IS ?)) ORDER BY id = ? DESC LIMIT 1",
+                    (self.tournament, sheet_id, nickname, pubg_id, user_id, sheet_id),
+                ).fetchone()
+                if orphan:
+                    self._conn.execute("UPDATE registrations SET sheet_row = ?, dirty = ? WHERE id = ?",
+                                       (index, int(orphan[0] != sheet_id), orphan[0]))
+                elif self.find_by_pubg_id(pubg_id) is not None:
+                    logger.warning("Sheet import: row %d repeats PUBG ID %s; skipped", index, pubg_id)
+                    continue
+                else:
+                    # dirty, so the new id is written back to column D
+                    self._insert(user_id, nickname, pubg_id, sheet_row=index, dirty=True)
+                changed += 1
+            if deleted:
+                self._conn.executemany("DELETE FROM registrations WHERE id = ?", [(reg_id,) for reg_id in deleted])
+                logger.info("Sheet import: deleted %d registration(s) removed from the sheet", len(deleted))
+                changed += len(deleted)
+        return changed
+
+    def close(self):
+        self._conn.close()
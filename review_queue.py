@@ -0,0 +1,223 @@
+# review_queue.py
+"""
+Receipt review dispatcher for several admins.
+
+Receipts used to go to ADMINS[0] only. ReviewDispatcher assigns each receipt
+to the admin with the fewest pending receipts (round-robin among ties) and
+records a claim when someone decides, so the same receipt cannot be approved
+or rejected twice. It also keeps queue depth and time-to-decision statistics.
+
+Everything here runs on the event loop thread without awaiting, so each
+method is atomic with respect to other handlers. Receipts are written to
+SQLite in the same call, so their ids stay unique across restarts and buttons
+sent before a restart still find their receipt.
+"""
+
+import itertools
+import json
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+import db
+
+PENDING = "pending"
+APPROVED = "approved"
+REJECTED = "rejected"
+SUPERSEDED = "superseded"
+
+
+class Receipt:
+    __slots__ = ("id", "user_id", "admin_id", "caption", "submitted_at", "messages", "status", "decided_by",
+                 "decided_at")
+
+    def __init__(self, receipt_id: int, user_id: int, admin_id: int, caption: str,
+                 submitted_at: Optional[float] = None):
+        self.id = receipt_id
+        self.user_id = user_id
+        self.admin_id = admin_id
+        self.caption = caption
+        self.submitted_at = submitted_at or time.time()
+        self.messages: List[Tuple[int, int]] = []  # (chat_id, message_id) of every admin copy
+        self.status = PENDING
+        self.decided_by: Optional[int] = None
+        self.decided_at: Optional[float] = None
+
+    @classmethod
+    def from_row(cls, row) -> "Receipt":
+        receipt_id, user_id, admin_id, caption, submitted_at, messages, status, decided_by, decided_at = row
+        receipt = cls(receipt_id, user_id, admin_id, caption, submitted_at)
+        receipt.messages = [tuple(m) for m in json.loads(messages)]
+        receipt.status = status
+        receipt.decided_by = decided_by
+        receipt.decided_at = decided_at
+        return receipt
+
+
+_COLUMNS = "id, user_id, admin_id, caption, submitted_at, messages, status, decided_by, decided_at"
+
+
+class ReviewDispatcher:
+    def __init__(self, db_path: str, admins: Sequence[int], history: int = 1000, keep_decided: int = 10_000):
+        self.admins = list(admins)
+        self._rr = itertools.cycle(range(len(self.admins))) if self.admins else None
+        self._pending: Dict[int, Receipt] = {}  # user_id -> pending receipt
+        self._decided: "OrderedDict[int, Receipt]" = OrderedDict()
+        self._keep_decided = keep_decided
+        self._decision_seconds: Deque[float] = deque(maxlen=history)
+        self.submitted = 0
+        self.decided = 0
+        self._conn = db.connect(db_path)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS review_receipts ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " user_id INTEGER NOT NULL,"
+            " admin_id INTEGER NOT NULL,"
+            " caption TEXT NOT NULL,"
+            " submitted_at REAL NOT NULL,"
+            " messages TEXT NOT NULL DEFAULT '[]',"
+            " status TEXT NOT NULL,"
+            " decided_by INTEGER,"
+            " decided_at REAL);"
+            "CREATE INDEX IF NOT EXISTS ix_review_status ON review_receipts (status, decided_at);"
+        )
+        for row in self._conn.execute(f"SELECT {_COLUMNS} FROM review_receipts WHERE status = ? ORDER BY id",
+                                      (PENDING,)):
+            receipt = Receipt.from_row(row)
+            self._pending[receipt.user_id] = receipt
+        decided = self._conn.execute(
+            f"SELECT {_COLUMNS} FROM review_receipts WHERE decided_at IS NOT NULL"
+            " ORDER BY decided_at DESC LIMIT ?", (keep_decided,)).fetchall()
+        for row in reversed(decided):
+            receipt = Receipt.from_row(row)
+            self._decided[receipt.user_id] = receipt
+            self._decided.move_to_end(receipt.user_id)
+
+    def pending_by_admin(self) -> Dict[int, int]:
+        counts = {admin_id: 0 for admin_id in self.admins}
+        for receipt in self._pending.values():
+            counts[receipt.admin_id] = counts.get(receipt.admin_id, 0) + 1
+        return counts
+
+    def pick_admin(self) -> Optional[int]:
+        """
+        Least-pending admin; ties are broken round-robin so load stays even.
+        """
+        if not self.admins:
+            return None
+        counts = self.pending_by_admin()
+        least = min(counts[a] for a in self.admins)
+        for _ in range(len(self.admins)):
+            admin_id = self.admins[next(self._rr)]
+            if counts[admin_id] == least:
+                return admin_id
+        return self.admins[0]
+
+    def submit(self, user_id: int, admin_id: int, caption: str) -> Tuple[Receipt, Optional[Receipt]]:
+        """
+        Registers a new receipt. Returns (receipt, previous pending receipt of
+        the same user, now superseded — its admin copies should be updated).
+        """
+        previous = self._pending.pop(user_id, None)
+        receipt = Receipt(0, user_id, admin_id, caption)
+        with self._conn:
+            if previous is not None:
+                previous.status = SUPERSEDED
+                self._conn.execute("UPDATE review_receipts SET status = ? WHERE id = ?", (SUPERSEDED, previous.id))
+            receipt.id = self._conn.execute(
+                "INSERT INTO review_receipts (user_id, admin_id, caption, submitted_at, status) VALUES (?, ?, ?, ?, ?)",
+                (user_id, admin_id, caption, receipt.submitted_at, PENDING),
+            ).lastrowid
+        self._pending[user_id] = receipt
+        self.submitted += 1
+        return receipt, previous
+
+    def add_message(self, receipt: Receipt, chat_id: int, message_id: int):
+        """
+        Remembers an admin copy of `receipt`, so it can be closed after a restart too.
+        """
+        receipt.messages.append((chat_id, message_id))
+        with self._conn:
+            self._conn.execute("UPDATE review_receipts SET messages = ? WHERE id = ?",
+                               (json.dumps(receipt.messages), receipt.id))
+
+    def cancel(self, user_id: int) -> Optional[Receipt]:
+        """
+        Drops a pending receipt (for example when forwarding it to an admin failed).
+        """
+        receipt = self._pending.pop(user_id, None)
+        if receipt is not None:
+            with self._conn:
+                self._conn.execute("DELETE FROM review_receipts WHERE id = ?", (receipt.id,))
+        return receipt
+
+    def claim(self, user_id: int, admin_id: int, decision: str,
+              receipt_id: Optional[int] = None) -> Tuple[bool, Optional[Receipt]]:
+        """
+        Records `admin_id`'s decision. Returns (False, receipt) if somebody has
+        already decided, or the button belongs to another receipt (superseded,
+        or a legacy button without a receipt id while a receipt is pending);
+        (True, None) for receipts missing from the database (legacy buttons),
+        (True, receipt) otherwise. Decisions on unknown receipts are recorded
+        too, so their other button is refused afterwards.
+        """
+        receipt = self._pending.get(user_id)
+        if receipt is not None and receipt.id != receipt_id:
+            return False, None
+        if receipt is None:
+            if user_id in self._decided:
+                return False, self._decided[user_id]
+            if receipt_id is not None:
+                row = self._conn.execute(f"SELECT {_COLUMNS} FROM review_receipts WHERE id = ?",
+                                         (receipt_id,)).fetchone()
+                if row is not None:
+                    return False, Receipt.from_row(row)
+            unknown = Receipt(receipt_id, user_id, admin_id, "")
+            with self._conn:
+                unknown.id = self._conn.execute(
+                    "INSERT INTO review_receipts (id, user_id, admin_id, caption, submitted_at, status)"
+                    " VALUES (?, ?, ?, '', ?, ?)",
+                    (receipt_id, user_id, admin_id, unknown.submitted_at, PENDING),
+                ).lastrowid
+                self._record(unknown, admin_id, decision)
+            return True, None
+        del self._pending[user_id]
+        with self._conn:
+            self._record(receipt, admin_id, decision)
+        self._decision_seconds.append(receipt.decided_at - receipt.submitted_at)
+        return True, receipt
+
+    def _record(self, receipt: Receipt, admin_id: int, decision: str):
+        receipt.status = decision
+        receipt.decided_by = admin_id
+        receipt.decided_at = time.time()
+        self._conn.execute("UPDATE review_receipts SET status = ?, decided_by = ?, decided_at = ? WHERE id = ?",
+                           (decision, admin_id, receipt.decided_at, receipt.id))
+        self.decided += 1
+        self._decided[receipt.user_id] = receipt
+        self._decided.move_to_end(receipt.user_id)
+        while len(self._decided) > self._keep_decided:
+            self._decided.popitem(last=False)
+
+    def stats(self) -> Dict[str, object]:
+        durations = sorted(self._decision_seconds)
+
+        def pct(p: float) -> float:
+            if not durations:
+                return 0.0
+            return round(durations[min(len(durations) - 1, int(p * len(durations)))], 1)
+
+        oldest = min((r.submitted_at for r in self._pending.values()), default=None)
+        return {
+            "pending": len(self._pending),
+            "pending_by_admin": self.pending_by_admin(),
+            "oldest_pending_s": round(time.time() - oldest, 1) if oldest else 0.0,
+            "submitted": self.submitted,
+            "decided": self.decided,
+            "decision_p50_s": pct(0.5),
+            "decision_p95_s": pct(0.95),
+            "decision_avg_s": round(sum(durations) / len(durations), 1) if durations else 0.0,
+        }
+
+    def close(self):
+        self._conn.close()
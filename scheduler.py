@@ -0,0 +1,103 @@
+# scheduler.py
+"""
+Delayed-action scheduler ("delete this message after N seconds" and similar).
+
+Sleeping inside a handler keeps the update's task alive for the whole delay.
+Here all pending timers live in one heap served by a single background task,
+so a pending timer costs one small heap entry instead of a sleeping task.
+Cancelled timers are dropped lazily when they reach the top of the heap.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduledJob:
+    __slots__ = ("when", "fn", "args", "cancelled")
+
+    def __init__(self, when: float, fn: Callable[..., Awaitable[Any]], args: tuple):
+        self.when = when
+        self.fn = fn
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class DelayedScheduler:
+    def __init__(self):
+        self._heap: List[Tuple[float, int, ScheduledJob]] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+        self.fired = 0
+        self.failed = 0
+
+    def call_later(self, delay: float, fn: Callable[..., Awaitable[Any]], *args) -> ScheduledJob:
+        """
+        Runs coroutine function `fn(*args)` after `delay` seconds. Returns a job
+        that can be cancelled. Must be called from the event loop thread.
+        """
+        loop = asyncio.get_running_loop()
+        job = ScheduledJob(loop.time() + delay, fn, args)
+        heapq.heappush(self._heap, (job.when, next(self._seq), job))
+        if self._heap[0][2] is job:
+            self._wakeup.set()
+        self.start()
+        return job
+
+    def pending(self) -> int:
+        return sum(1 for _, _, job in self._heap if not job.cancelled)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stops the runner. Timers that have not fired yet are dropped.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._running):
+            task.cancel()
+        self._heap.clear()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            while self._heap and (self._heap[0][2].cancelled or self._heap[0][0] <= now):
+                _, _, job = heapq.heappop(self._heap)
+                if not job.cancelled:
+                    self._spawn(job)
+            timeout = self._heap[0][0] - now if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _spawn(self, job: ScheduledJob):
+        task = asyncio.create_task(job.fn(*job.args))
+        self._running.add(task)
+        task.add_done_callback(self._job_done)
+
+    def _job_done(self, task: asyncio.Task):
+        self._running.discard(task)
+        self.fired += 1
+        if not task.cancelled() and task.exception() is not None:
+            self.failed += 1
+            logger.warning("Scheduled job failed: %r", task.exception())
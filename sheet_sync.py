@@ -0,0 +1,191 @@
+# sheet_sync.py
+"""
+Background mirror between the RegistrationStore and the Google worksheet.
+
+One task does all the work, so a push and a pull never overlap:
+- push: dirty rows never written go out with one `append_rows` call per batch;
+  dirty rows already in the sheet go out with one `batch_update`. Each user is
+  told (`on_committed`) once their row is in the sheet.
+- pull: every `pull_interval` seconds the sheet is downloaded and rows edited
+  or added by hand are imported into the store (`on_imported` is told how many).
+
+New rows wake the task through `nudge()`; it then waits `window` seconds so a
+burst of registrations becomes a single request. Failures are retried with
+jittered exponential backoff, longer on HTTP 429. Dirty rows live in SQLite,
+so nothing is lost across restarts. Delivery is at-least-once.
+"""
+
+import asyncio
+import logging
+import random
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from registrations import RegistrationStore
+
+logger = logging.getLogger(__name__)
+
+CommitCallback = Callable[[Optional[int], List[Any]], Awaitable[None]]
+
+_UPDATED_RANGE_ROW = re.compile(r"![A-Z]+(\d+)")
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    """
+    True for gspread APIError (or anything with a `.response`) carrying HTTP 429.
+    """
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None) == 429
+
+
+def backoff_delay(attempt: int, exc: BaseException, base: float = 1.0, cap: float = 60.0) -> float:
+    """
+    Exponential backoff with full jitter; rate-limit errors start from a longer base.
+    """
+    if is_rate_limited(exc):
+        base = max(base, 5.0)
+    return random.uniform(0, min(cap, base * (2 ** min(attempt, 16))))
+
+
+def first_appended_row(response: Any) -> Optional[int]:
+    """
+    Row number of the first appended row, from the append response's updatedRange ("'Sheet'!A12:C14").
+    """
+    try:
+        match = _UPDATED_RANGE_ROW.search(response["updates"]["updatedRange"])
+    except (KeyError, TypeError):
+        return None
+    return int(match.group(1)) if match else None
+
+
+class SheetSync:
+    def __init__(self, gateway, store: RegistrationStore, window: float = 1.0, pull_interval: float = 60.0,
+                 max_batch: int = 200, on_committed: Optional[CommitCallback] = None,
+                 on_imported: Optional[Callable[[int], None]] = None):
+        self._gateway = gateway
+        self.store = store
+        self.window = window
+        self.pull_interval = pull_interval
+        self.max_batch = max_batch
+        self.on_committed = on_committed
+        self.on_imported = on_imported
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.appended_rows = 0
+        self.updated_rows = 0
+        self.imported_rows = 0
+        self.pulls = 0
+        self.failures = 0
+        self.last_pull_ms = 0.0
+
+    def nudge(self):
+        """
+        Signals that the store has new dirty rows.
+        """
+        self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stops the task. Dirty rows stay in the store and are pushed after the next start.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "registrations": self.store.count(),
+            "dirty": self.store.dirty_count(),
+            "appended_rows": self.appended_rows,
+            "updated_rows": self.updated_rows,
+            "imported_rows": self.imported_rows,
+            "pulls": self.pulls,
+            "failures": self.failures,
+            "last_pull_ms": round(self.last_pull_ms, 1),
+        }
+
+    async def _run(self):
+        while True:
+            try:
+                await self._loop()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Sheet sync loop crashed; restarting in 5s")
+                await asyncio.sleep(5.0)
+
+    async def _loop(self):
+        next_pull = time.monotonic()
+        attempt = 0
+        while True:
+            self._wakeup.clear()
+            try:
+                if time.monotonic() >= next_pull:
+                    await self.pull()
+                    next_pull = time.monotonic() + self.pull_interval
+                await self.push()
+                attempt = 0
+            except Exception as e:
+                self.failures += 1
+                delay = backoff_delay(attempt, e)
+                attempt = min(attempt + 1, 16)
+                logger.warning("Sheet sync failed (%s); retry in %.1fs", e, delay)
+                await asyncio.sleep(delay)
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, next_pull - time.monotonic()))
+                await asyncio.sleep(self.window)
+            except asyncio.TimeoutError:
+                pass
+
+    async def pull(self):
+        started = time.perf_counter()
+        data = await self._gateway.get_all_values()
+        changed = self.store.import_rows(data)
+        self.last_pull_ms = (time.perf_counter() - started) * 1000
+        self.pulls += 1
+        if changed:
+            self.imported_rows += changed
+            logger.info("Sheet sync: imported %d row(s) edited in the sheet", changed)
+            if self.on_imported:
+                self.on_imported(changed)
+
+    async def push(self):
+        while True:
+            appends = self.store.pending_appends(self.max_batch)
+            if appends:
+                response = await self._gateway.append_rows([reg.sheet_values() for reg, _ in appends])
+                first = first_appended_row(response)
+                self.store.mark_synced([
+                    (reg.id, first + i if first else None, updated_at)
+                    for i, (reg, updated_at) in enumerate(appends)
+                ])
+                self.appended_rows += len(appends)
+                logger.info("Sheet sync: appended %d row(s)", len(appends))
+                if self.on_committed:
+                    for reg, _ in appends:
+                        try:
+                            await self.on_committed(reg.user_id, reg.sheet_values())
+                        except Exception:
+                            logger.exception("on_committed callback failed for user %s", reg.user_id)
+                continue
+            updates = self.store.pending_updates(self.max_batch)
+            if updates:
+                await self._gateway.batch_update([
+                    {"range": f"A{sheet_row}:D{sheet_row}", "values": [reg.sheet_values()]}
+                    for reg, sheet_row, _ in updates
+                ])
+                self.store.mark_synced([(reg.id, None, updated_at) for reg, _, updated_at in updates])
+                self.updated_rows += len(updates)
+                logger.info("Sheet sync: updated %d row(s)", len(updates))
+                continue
+            return
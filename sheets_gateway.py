@@ -0,0 +1,104 @@
+# sheets_gateway.py
+"""
+Async gateway for Google Sheets.
+
+gspread is a blocking HTTP client. Calling it directly from an aiogram handler
+stops the whole event loop until Google answers, so every other user waits too.
+SheetsGateway runs those calls in a bounded thread pool, limits how many run at
+once and puts a timeout on each call — a slow Sheets response only delays the
+coroutine that awaits it.
+"""
+
+import asyncio
+import contextlib
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SheetsGateway:
+    """
+    Wraps a `connect()` callable that returns a gspread Worksheet.
+
+    Every public method is a coroutine; the blocking work happens in worker
+    threads. The concurrency slot is held until the worker thread actually
+    finishes, so a timed-out call still counts against the limit and the pool
+    can never be flooded by abandoned requests.
+    """
+
+    def __init__(self, connect: Callable[[], Any], max_workers: int = 4,
+                 max_concurrency: Optional[int] = None, timeout: float = 15.0, metrics=None):
+        self._connect = connect
+        self._metrics = metrics  # optional metrics.Metrics; calls are timed as ("sheets", fn name)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sheets")
+        self._semaphore = asyncio.Semaphore(max_concurrency or max_workers)
+        self.timeout = timeout
+
+    async def run(self, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Run a blocking callable in the pool and await its result.
+        Raises asyncio.TimeoutError if it does not finish within `timeout` seconds.
+        """
+        if self._metrics is None:
+            return await self._run(fn, args, kwargs, timeout)
+        with self._metrics.timer("sheets", getattr(fn, "__name__", "call")):
+            return await self._run(fn, args, kwargs, timeout)
+
+    async def _run(self, fn: Callable[..., Any], args, kwargs, timeout: Optional[float]) -> Any:
+        loop = asyncio.get_running_loop()
+        await self._semaphore.acquire()
+        try:
+            cfut = self._executor.submit(functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+        def _release(_):
+            # called from the worker thread (or from cancel() on the loop thread)
+            with contextlib.suppress(RuntimeError):  # loop already closed on shutdown
+                loop.call_soon_threadsafe(self._semaphore.release)
+
+        cfut.add_done_callback(_release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(cfut), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Sheets call %s timed out after %.1fs", getattr(fn, "__name__", fn), timeout or self.timeout)
+            raise
+
+    async def worksheet(self):
+        """
+        Returns the (cached) Worksheet, connecting on first use.
+        """
+        return await self.run(self._connect)
+
+    async def get_all_values(self) -> List[List[str]]:
+        ws = await self.worksheet()
+        return await self.run(ws.get_all_values)
+
+    async def append_row(self, row: List[Any]):
+        ws = await self.worksheet()
+        return await self.run(ws.append_row, row)
+
+    async def append_rows(self, rows: List[List[Any]]):
+        ws = await self.worksheet()
+        return await self.run(ws.append_rows, rows)
+
+    async def get_range(self, a1: str) -> List[List[str]]:
+        """
+        Values of an A1 range on the bot's worksheet, or on another tab ("Natijalar!A2:D60").
+        """
+        ws = await self.worksheet()
+        if "!" in a1:
+            response = await self.run(ws.spreadsheet.values_get, a1)
+            return response.get("values", [])
+        return await self.run(ws.get, a1)
+
+    async def batch_update(self, data: List[dict]):
+        ws = await self.worksheet()
+        return await self.run(ws.batch_update, data)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,131 @@
+# standings.py
+"""
+Incremental, points-based tournament standings.
+
+Players are kept in a list sorted by their ranking key, with a dict from
+player to key beside it. A result update removes the old key and inserts the
+new one with `bisect`: an O(log n) search plus a memmove of the tail, which is
+microseconds even at tens of thousands of players. Top-N is a slice and
+"my rank" is one bisect. Nothing is recomputed from scratch after the initial
+load.
+
+Ranking order: points, then placement points, then kills, then best
+placement, then registration order.
+"""
+
+import bisect
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+NO_BEST = 10 ** 6  # sorts players without a placement after everyone with one
+NOT_REGISTERED = 10 ** 12  # order for players who have results but no registration
+
+
+class Standing(NamedTuple):
+    rank: int
+    player: str
+    pubg_id: str
+    nickname: str
+    points: int
+    placement_points: int
+    kills: int
+    wins: int
+    matches: int
+
+
+class _Entry(NamedTuple):
+    key: Tuple
+    pubg_id: str
+    nickname: str
+    points: int
+    placement_points: int
+    kills: int
+    wins: int
+    matches: int
+    best_placement: Optional[int]
+    order: int
+
+
+class StandingsEngine:
+    def __init__(self):
+        self._keys: List[Tuple] = []
+        self._entries: Dict[str, _Entry] = {}
+        # bumped on every change; rendered pages are cached against it
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, player: str) -> bool:
+        return player in self._entries
+
+    @staticmethod
+    def _make_key(player: str, points: int, placement_points: int, kills: int, best_placement: Optional[int],
+                  order: int) -> Tuple:
+        return (-points, -placement_points, -kills, best_placement or NO_BEST, order, player)
+
+    def load(self, entries: Iterable[Tuple[str, str, str, int, int, int, int, int, Optional[int], int]]):
+        """
+        Bulk (re)build from (player, pubg_id, nickname, points, placement_points,
+        kills, wins, matches, best_placement, order) tuples; one sort.
+        """
+        self._entries = {}
+        for player, pubg_id, nickname, points, pp, kills, wins, played, best, order in entries:
+            key = self._make_key(player, points, pp, kills, best, order)
+            self._entries[player] = _Entry(key, pubg_id, nickname, points, pp, kills, wins, played, best, order)
+        self._keys = sorted(e.key for e in self._entries.values())
+        self.version += 1
+
+    def set_player(self, player: str, pubg_id: str, nickname: str, order: int):
+        """
+        Adds a registered player or updates their name/order; match totals are kept.
+        """
+        old = self._entries.get(player)
+        if old is None:
+            self._replace(player, _Entry(self._make_key(player, 0, 0, 0, None, order),
+                                         pubg_id, nickname, 0, 0, 0, 0, 0, None, order))
+        else:
+            self._replace(player, old._replace(key=self._make_key(
+                player, old.points, old.placement_points, old.kills, old.best_placement, order),
+                pubg_id=pubg_id, nickname=nickname, order=order))
+
+    def set_results(self, player: str, pubg_id: str, points: int, placement_points: int, kills: int, wins: int,
+                    matches: int, best_placement: Optional[int], nickname: str = ""):
+        """
+        Replaces a player's match totals; players without a registration are added at the end of their tie.
+        """
+        old = self._entries.get(player)
+        order = old.order if old is not None else NOT_REGISTERED
+        nickname = old.nickname if old is not None and old.nickname else nickname
+        self._replace(player, _Entry(self._make_key(player, points, placement_points, kills, best_placement, order),
+                                     pubg_id, nickname, points, placement_points, kills, wins, matches,
+                                     best_placement, order))
+
+    def _replace(self, player: str, entry: _Entry):
+        old = self._entries.get(player)
+        if old == entry:
+            return
+        if old is not None:
+            del self._keys[bisect.bisect_left(self._keys, old.key)]
+        self._entries[player] = entry
+        bisect.insort(self._keys, entry.key)
+        self.version += 1
+
+    def remove(self, player: str):
+        old = self._entries.pop(player, None)
+        if old is not None:
+            del self._keys[bisect.bisect_left(self._keys, old.key)]
+            self.version += 1
+
+    def _standing(self, rank: int, key: Tuple) -> Standing:
+        e = self._entries[key[-1]]
+        return Standing(rank, key[-1], e.pubg_id, e.nickname, e.points, e.placement_points, e.kills, e.wins,
+                        e.matches)
+
+    def top(self, limit: int, offset: int = 0) -> List[Standing]:
+        return [self._standing(offset + i + 1, key) for i, key in enumerate(self._keys[offset:offset + limit])]
+
+    def rank(self, player: str) -> Optional[Standing]:
+        entry = self._entries.get(player)
+        if entry is None:
+            return None
+        return self._standing(bisect.bisect_left(self._keys, entry.key) + 1, entry.key)
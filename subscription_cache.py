@@ -0,0 +1,79 @@
+# subscription_cache.py
+"""
+Cache for required-channel membership checks.
+
+`check_subscription` used to call `get_chat_member` on every menu tap. Results
+are now kept per user_id: subscribed users for `positive_ttl` seconds, not
+subscribed users for a shorter `negative_ttl` (so someone who just joined is
+not locked out for long). The cache is an LRU bounded to `maxsize` users.
+Concurrent checks for the same user share one request, and several required
+channels are checked concurrently.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# checker(channel, user_id) -> True if subscribed; raises on API errors
+MembershipChecker = Callable[[str, int], Awaitable[bool]]
+
+
+class SubscriptionCache:
+    def __init__(self, checker: MembershipChecker, channels: Sequence[str], positive_ttl: float = 600.0,
+                 negative_ttl: float = 30.0, maxsize: int = 50_000):
+        self._checker = checker
+        self.channels = tuple(channels)
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[int, Tuple[bool, float]]" = OrderedDict()  # user_id -> (result, expires_at)
+        self._inflight: Dict[int, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def is_subscribed(self, user_id: int, force: bool = False) -> bool:
+        """
+        Returns the cached result unless it has expired or `force` is set.
+        API errors are not cached and count as "not subscribed".
+        """
+        if not force:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+        self.misses += 1
+        fut = self._inflight.get(user_id)
+        if fut is None:
+            fut = asyncio.ensure_future(self._fetch(user_id))
+            self._inflight[user_id] = fut
+            fut.add_done_callback(lambda _: self._inflight.pop(user_id, None))
+        return await asyncio.shield(fut)
+
+    def invalidate(self, user_id: int):
+        self._entries.pop(user_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "errors": self.errors, "size": len(self._entries)}
+
+    async def _fetch(self, user_id: int) -> bool:
+        results = await asyncio.gather(
+            *(self._checker(channel, user_id) for channel in self.channels), return_exceptions=True
+        )
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            self.errors += 1
+            logger.warning("Subscription check failed for user %s: %s", user_id, errors[0])
+            return False
+        subscribed = all(results)
+        ttl = self.positive_ttl if subscribed else self.negative_ttl
+        self._entries[user_id] = (subscribed, time.monotonic() + ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return subscribed
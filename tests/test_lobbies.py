@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from lobbies import CONFIRMED, HELD, WAITLISTED, LobbyManager
+
+
+@pytest.fixture
+def lobbies(tmp_path):
+    manager = LobbyManager(str(tmp_path / "bot.db"), "test", lobby_size=2, lobby_count=1, hold_seconds=60)
+    yield manager
+    manager.close()
+
+
+def test_rejecting_a_second_receipt_keeps_a_confirmed_seat(lobbies):
+    lobbies.reserve(1)
+    lobbies.reserve(2)
+    assert lobbies.reserve(3).status == WAITLISTED
+    lobbies.confirm(1)
+    # user 1 registers again; the new receipt is rejected
+    assert lobbies.reserve(1).status == CONFIRMED
+    assert lobbies.release(1) == []
+    assert lobbies.seat_of(1).status == CONFIRMED
+    assert lobbies.placement(3).status == WAITLISTED
+
+
+def test_rejection_keeps_an_approved_waitlist_place(lobbies):
+    lobbies.reserve(1)
+    lobbies.reserve(2)
+    lobbies.reserve(3)
+    assert lobbies.confirm(3).status == WAITLISTED
+    assert lobbies.release(3) == []
+    assert lobbies.placement(3).position == 1
+
+
+def test_rejection_frees_a_held_seat_for_the_waitlist(lobbies):
+    lobbies.reserve(1)
+    lobbies.reserve(2)
+    lobbies.reserve(3)
+    promoted = lobbies.release(2)
+    assert [(p.status, p.seat.user_id) for p in promoted] == [(HELD, 3)]
+
+
+def test_cancelling_frees_a_confirmed_seat(lobbies):
+    lobbies.reserve(1)
+    lobbies.confirm(1)
+    lobbies.release(1, confirmed=True)
+    assert lobbies.seat_of(1) is None
+
+
+def test_concurrent_receipts_never_oversell(tmp_path):
+    manager = LobbyManager(str(tmp_path / "bot.db"), "test", lobby_size=8, lobby_count=10)
+
+    async def receipt(user_id):
+        await asyncio.sleep(0)
+        return manager.reserve(user_id)
+
+    async def storm():
+        return await asyncio.gather(*(receipt(user_id) for user_id in range(500)))
+
+    placements = asyncio.run(storm())
+    seats = [(p.seat.lobby, p.seat.seat) for p in placements if p.status == HELD]
+    assert len(seats) == len(set(seats)) == 80
+    assert sorted(p.position for p in placements if p.status == WAITLISTED) == list(range(1, 421))
+    manager.close()
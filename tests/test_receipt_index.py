@@ -0,0 +1,64 @@
+import pytest
+
+from receipt_index import ReceiptIndex
+
+HASH = 0x5A5A_1234_C3C3_0F0F
+HIGH_BIT_HASH = (1 << 63) | 0x0123_4567_89AB_CDEF
+
+
+def flip(value, *bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "bot.db")
+
+
+@pytest.fixture
+def index(db_path):
+    receipts = ReceiptIndex(db_path, max_distance=4, hash_workers=1)
+    yield receipts
+    receipts.close()
+
+
+def test_the_same_file_is_an_exact_match(index):
+    index.add("file-a", 1, HASH)
+    match = index.find("file-a", None)
+    assert (match.kind, match.user_id, match.distance) == ("exact", 1, 0)
+
+
+def test_a_similar_image_within_max_distance_is_a_near_match(index):
+    index.add("file-a", 1, HASH)
+    assert index.find("file-b", HASH).distance == 0
+    # one flip in each of four bands: only the fifth band still agrees
+    match = index.find("file-b", flip(HASH, 0, 13, 26, 39))
+    assert (match.kind, match.user_id, match.distance) == ("near", 1, 4)
+
+
+def test_one_bit_past_max_distance_is_no_match(index):
+    index.add("file-a", 1, HASH)
+    assert index.find("file-b", flip(HASH, 0, 13, 26, 39, 52)) is None  # every band differs
+    assert index.find("file-b", flip(HASH, 0, 1, 2, 3, 4)) is None  # bands agree, too many bits differ
+
+
+def test_the_closest_receipt_wins(index):
+    index.add("file-a", 1, flip(HASH, 0, 1, 2))
+    index.add("file-b", 2, flip(HASH, 60))
+    assert index.find("file-c", HASH).user_id == 2
+
+
+def test_hashes_with_the_high_bit_set_survive_a_reopen(db_path, index):
+    index.add("file-a", 1, HIGH_BIT_HASH)
+    index.add("file-b", 2, HASH)
+    assert index.find("file-c", flip(HIGH_BIT_HASH, 63, 5)).distance == 2
+    index.close()
+    reopened = ReceiptIndex(db_path, max_distance=4, hash_workers=1)
+    assert len(reopened) == 2
+    assert reopened.find("file-a").kind == "exact"
+    match = reopened.find("file-c", flip(HIGH_BIT_HASH, 63, 5))
+    assert (match.user_id, match.distance) == (1, 2)
+    assert reopened.find("file-d", flip(HASH, 3)).user_id == 2
+    reopened.close()
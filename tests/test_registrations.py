@@ -0,0 +1,72 @@
+from registrations import RegistrationStore
+from sheet_sync import backoff_delay
+
+HEADER = ["Nickname", "PUBG ID", "User ID", "Registration ID"]
+
+
+def mirrored(store, names):
+    """
+    Registers `names` and marks them written to rows 2.. of the sheet; returns the sheet.
+    """
+    regs = [store.add(100 + i, name, "p" + name) for i, name in enumerate(names)]
+    store.mark_synced([(reg.id, row, updated_at) for row, (reg, updated_at)
+                       in enumerate(store.pending_appends(100), start=2)])
+    return [HEADER] + [[str(v) for v in reg.sheet_values()] for reg in regs]
+
+
+def test_deleting_a_row_deletes_only_that_registration(tmp_path):
+    store = RegistrationStore(str(tmp_path / "bot.db"), "test")
+    sheet = mirrored(store, "ABCD")
+    del sheet[2]  # B
+    assert store.import_rows(sheet) == 3  # B deleted, C and D moved up
+    assert [(r.nickname, r.user_id) for r in store.list(limit=-1)] == [("A", 100), ("C", 102), ("D", 103)]
+    assert store.by_user(101) == []
+    new = store.add(200, "E", "pE")
+    assert store.pending_updates(100) == []
+    assert [reg.id for reg, _ in store.pending_appends(100)] == [new.id]
+    store.close()
+
+
+def test_sorting_the_sheet_keeps_registrations_intact(tmp_path):
+    store = RegistrationStore(str(tmp_path / "bot.db"), "test")
+    sheet = mirrored(store, "ABC")
+    sheet[1:] = sheet[:0:-1]
+    store.import_rows(sheet)
+    assert [(r.nickname, r.pubg_id) for r in store.list(limit=-1)] == [("C", "pC"), ("B", "pB"), ("A", "pA")]
+    assert store.dirty_count() == 0
+    store.close()
+
+
+def test_rows_without_an_id_are_matched_by_content_and_get_one(tmp_path):
+    store = RegistrationStore(str(tmp_path / "bot.db"), "test")
+    sheet = [row[:3] for row in mirrored(store, "ABC")]  # written before column D existed
+    del sheet[1]
+    sheet.append(["Z", "pZ", ""])  # added by hand
+    store.import_rows(sheet)
+    assert [r.nickname for r in store.list(limit=-1)] == ["B", "C", "Z"]
+    assert [reg.nickname for reg, _, _ in store.pending_updates(100)] == ["B", "C", "Z"]
+    store.close()
+
+
+def test_an_empty_sheet_deletes_nothing(tmp_path):
+    store = RegistrationStore(str(tmp_path / "bot.db"), "test")
+    mirrored(store, "AB")
+    assert store.import_rows([HEADER]) == 0
+    assert store.count() == 2
+    store.close()
+
+
+def test_backoff_stays_capped_after_many_failures():
+    assert 0 <= backoff_delay(5000, FileNotFoundError()) <= 60.0
+
+
+def test_repeated_rows_are_not_inserted_again(tmp_path):
+    store = RegistrationStore(str(tmp_path / "bot.db"), "test")
+    reg = store.add(11, "Nick", "555")
+    store.mark_synced([(reg.id, 3, updated_at) for _, updated_at in store.pending_appends(100)])
+    row = [str(v) for v in reg.sheet_values()]
+    # the same append twice (a retried request that had succeeded), then a copy without the id
+    assert store.import_rows([HEADER, row, row, row[:3]]) == 1  # moved from row 3 to row 2
+    assert [(r.id, r.pubg_id) for r in store.list(limit=-1)] == [(reg.id, "555")]
+    assert store.dirty_count() == 0
+    store.close()
@@ -0,0 +1,88 @@
+import pytest
+
+from review_queue import APPROVED, PENDING, REJECTED, SUPERSEDED, ReviewDispatcher
+
+ADMINS = [10, 20]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "bot.db")
+
+
+@pytest.fixture
+def reviews(db_path):
+    dispatcher = ReviewDispatcher(db_path, ADMINS)
+    yield dispatcher
+    dispatcher.close()
+
+
+def test_a_receipt_is_decided_once(reviews):
+    receipt, _ = reviews.submit(1, 10, "")
+    assert reviews.claim(1, 10, APPROVED, receipt.id) == (True, receipt)
+    ok, decided = reviews.claim(1, 20, REJECTED, receipt.id)
+    assert not ok and decided is receipt
+    assert (receipt.status, receipt.decided_by) == (APPROVED, 10)
+
+
+def test_a_button_without_a_receipt_id_is_refused_while_a_receipt_is_pending(reviews):
+    receipt, _ = reviews.submit(1, 10, "")
+    assert reviews.claim(1, 10, APPROVED) == (False, None)
+    assert receipt.status == PENDING
+    assert reviews.claim(1, 10, APPROVED, receipt.id) == (True, receipt)
+
+
+def test_buttons_of_a_superseded_receipt_are_refused(reviews):
+    first, _ = reviews.submit(1, 10, "")
+    second, previous = reviews.submit(1, 20, "")
+    assert previous is first and first.status == SUPERSEDED
+    assert reviews.claim(1, 10, APPROVED, first.id) == (False, None)
+    assert second.status == PENDING
+    assert reviews.claim(1, 20, REJECTED, second.id) == (True, second)
+    ok, _ = reviews.claim(1, 10, APPROVED, first.id)
+    assert not ok
+
+
+def test_the_second_button_of_an_unknown_receipt_is_refused(reviews):
+    # a legacy button whose receipt is not in the database
+    assert reviews.claim(7, 10, APPROVED, 42) == (True, None)
+    ok, decided = reviews.claim(7, 20, REJECTED, 42)
+    assert not ok
+    assert (decided.id, decided.status, decided.decided_by) == (42, APPROVED, 10)
+    assert reviews.decided == 1
+
+
+def test_receipts_go_to_the_least_loaded_admin(reviews):
+    for user_id in range(4):
+        reviews.submit(user_id, reviews.pick_admin(), "")
+    assert reviews.pending_by_admin() == {10: 2, 20: 2}
+
+
+def test_receipt_ids_stay_unique_across_restarts(db_path):
+    before = ReviewDispatcher(db_path, ADMINS)
+    old, _ = before.submit(1, 10, "")
+    before.claim(1, 10, APPROVED, old.id)
+    before.close()
+    after = ReviewDispatcher(db_path, ADMINS)
+    new, _ = after.submit(2, 10, "")
+    assert new.id != old.id
+    # a button left from before the restart cannot decide the new receipt
+    assert after.claim(2, 20, REJECTED, old.id) == (False, None)
+    assert new.status == PENDING
+    after.close()
+
+
+def test_pending_receipts_survive_a_restart(db_path):
+    before = ReviewDispatcher(db_path, ADMINS)
+    receipt, _ = before.submit(1, 20, "caption")
+    before.add_message(receipt, 20, 555)
+    before.close()
+    after = ReviewDispatcher(db_path, ADMINS)
+    assert after.pending_by_admin() == {10: 0, 20: 1}
+    ok, restored = after.claim(1, 10, APPROVED, receipt.id)
+    assert ok and (restored.caption, restored.messages) == ("caption", [(20, 555)])
+    after.close()
+    again = ReviewDispatcher(db_path, ADMINS)
+    ok, decided = again.claim(1, 20, REJECTED, receipt.id)
+    assert not ok and decided.status == APPROVED
+    again.close()
@@ -0,0 +1,99 @@
+from standings import NOT_REGISTERED, StandingsEngine
+
+# (points, placement_points, kills, wins, matches, best_placement) per PUBG ID
+NO_RESULTS = (0, 0, 0, 0, 0, None)
+
+
+def rebuilt(registrations, results):
+    """
+    A fresh load() of the same data, built the way main.rebuild_standings does.
+    registrations: [(order, pubg_id, nickname)]; results: {pubg_id: (nickname, totals)}.
+    """
+    entries = {}
+    for order, pubg_id, nickname in registrations:
+        entries.setdefault(pubg_id, [pubg_id, nickname, *NO_RESULTS, order])
+    for pubg_id, (nickname, totals) in results.items():
+        entry = entries.setdefault(pubg_id, [pubg_id, nickname, *NO_RESULTS, NOT_REGISTERED])
+        entry[2:8] = totals
+    engine = StandingsEngine()
+    engine.load((player, *entry) for player, entry in entries.items())
+    return engine
+
+
+class Tournament:
+    """
+    Applies registrations and result imports to an engine incrementally, as main.py does.
+    """
+
+    def __init__(self):
+        self.engine = StandingsEngine()
+        self.registrations = []
+        self.results = {}
+
+    def register(self, order, pubg_id, nickname):
+        self.registrations.append((order, pubg_id, nickname))
+        self.engine.set_player(pubg_id, pubg_id, nickname, order)
+
+    def import_results(self, pubg_id, nickname, totals):
+        self.results[pubg_id] = (nickname, totals)
+        self.engine.set_results(pubg_id, pubg_id, *totals, nickname=nickname)
+
+    def remove_results(self, pubg_id):
+        del self.results[pubg_id]
+        if any(reg[1] == pubg_id for reg in self.registrations):
+            self.engine.set_results(pubg_id, pubg_id, *NO_RESULTS)
+        else:
+            self.engine.remove(pubg_id)
+
+    def assert_matches_rebuild(self):
+        fresh = rebuilt(self.registrations, self.results)
+        assert self.engine.top(100) == fresh.top(100)
+        for player in {reg[1] for reg in self.registrations} | set(self.results):
+            assert self.engine.rank(player) == fresh.rank(player)
+
+
+def test_incremental_updates_match_a_full_rebuild():
+    t = Tournament()
+    t.register(1, "p1", "Alpha")
+    t.register(2, "p2", "Bravo")
+    t.assert_matches_rebuild()
+    t.import_results("p2", "Bravo", (30, 10, 20, 1, 2, 1))
+    t.import_results("p9", "Ghost", (12, 2, 10, 0, 1, 4))  # has results, never registered
+    t.register(3, "p3", "Charlie")
+    t.assert_matches_rebuild()
+    t.import_results("p2", "Bravo", (18, 8, 10, 1, 1, 1))  # the match was re-imported
+    t.import_results("p1", "Alpha", (18, 8, 10, 0, 1, 2))
+    t.assert_matches_rebuild()
+    t.remove_results("p1")  # the match was deleted: a registered player keeps the row
+    t.remove_results("p9")  # an unregistered one disappears
+    t.assert_matches_rebuild()
+    assert "p9" not in t.engine
+    assert [s.player for s in t.engine.top(10)] == ["p2", "p1", "p3"]
+
+
+def test_imported_player_who_registers_later_takes_the_registered_name_and_order():
+    t = Tournament()
+    t.register(1, "p1", "Alpha")
+    t.import_results("p5", "", (0, 0, 0, 0, 1, None))
+    assert [s.player for s in t.engine.top(10)] == ["p1", "p5"]
+    t.register(2, "p5", "Echo")
+    t.register(3, "p3", "Charlie")
+    t.assert_matches_rebuild()
+    assert [(s.player, s.nickname, s.matches) for s in t.engine.top(10)] == [
+        ("p1", "Alpha", 0), ("p5", "Echo", 1), ("p3", "Charlie", 0)]
+
+
+def test_ties_are_broken_by_placement_points_kills_best_placement_then_order():
+    t = Tournament()
+    for order, pubg_id in enumerate(["a", "b", "c", "d", "e", "f"], start=1):
+        t.register(order, pubg_id, pubg_id.upper())
+    t.import_results("f", "F", (20, 10, 10, 1, 1, 1))
+    t.import_results("e", "E", (20, 10, 10, 0, 1, 1))
+    t.import_results("d", "D", (20, 10, 10, 0, 1, 3))
+    t.import_results("c", "C", (20, 10, 11, 0, 1, 5))
+    t.import_results("b", "B", (20, 12, 8, 0, 1, 2))
+    t.import_results("a", "A", (25, 0, 25, 0, 1, None))
+    t.import_results("x", "X", (20, 10, 10, 0, 1, 1))  # unregistered: after registered players on a full tie
+    t.assert_matches_rebuild()
+    assert [s.player for s in t.engine.top(10)] == ["a", "b", "c", "e", "f", "x", "d"]
+    assert [t.engine.rank(p).rank for p in ("a", "x", "d")] == [1, 6, 7]
@@ -0,0 +1,131 @@
+# throttling.py
+"""
+Per-user anti-flood for incoming messages and button presses.
+
+ThrottlingMiddleware is an aiogram outer middleware (`dp.message` and
+`dp.callback_query`), so it runs before filters and handlers. Every user gets
+a GCRA limiter per action ("reyting", "results", "check_subscription", ...):
+one float per active (user, action) pair, dropped as soon as the pair is idle
+long enough to have a full burst again, so memory only grows with users who
+are pressing buttons right now.
+
+Repeated presses of the same button while the first one is still being handled
+(or within `debounce` seconds) are answered silently and dropped, so the
+spinner stops without running the handler again.
+"""
+
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject
+
+Limit = Tuple[float, int]  # (actions per second, burst)
+
+
+def action_of(event: TelegramObject) -> str:
+    """
+    Throttling key: the command name for messages, the callback data prefix for button presses.
+    """
+    if isinstance(event, CallbackQuery):
+        return (event.data or "").split(":", 1)[0] or "callback"
+    text = (getattr(event, "text", None) or getattr(event, "caption", None) or "").strip()
+    if text.startswith("/"):
+        return text[1:].split(maxsplit=1)[0].split("@", 1)[0].lower() if len(text) > 1 else "message"
+    return "message"
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    def __init__(self, limits: Dict[str, Limit], default: Limit = (1.0, 5), debounce: float = 1.0,
+                 exempt: Iterable[int] = (), max_keys: int = 100_000):
+        self.limits = limits
+        self.default = default
+        self.debounce = debounce
+        self.exempt = set(exempt)
+        self.max_keys = max_keys
+        # (user_id, action) -> theoretical arrival time, oldest touch first
+        self._tat: "OrderedDict[Tuple[int, str], float]" = OrderedDict()
+        # (user_id, callback data) -> time the press finished, or None while it is being handled
+        self._presses: "OrderedDict[Tuple[int, str], Optional[float]]" = OrderedDict()
+        self.allowed = 0
+        self.throttled = 0
+        self.debounced = 0
+
+    def _evict(self, now: float):
+        # entries only move to the end when touched, so idle ones collect at the front
+        while self._tat:
+            key, tat = next(iter(self._tat.items()))
+            if tat > now and len(self._tat) <= self.max_keys:
+                break
+            del self._tat[key]
+        while self._presses:
+            key, finished = next(iter(self._presses.items()))
+            if (finished is None or finished + self.debounce > now) and len(self._presses) <= self.max_keys:
+                break
+            del self._presses[key]
+
+    def check(self, user_id: int, action: str) -> float:
+        """
+        Takes one slot for (user, action). Returns 0 if allowed, else seconds until the next slot.
+        """
+        rate, burst = self.limits.get(action, self.default)
+        interval = 1.0 / rate
+        now = time.monotonic()
+        self._evict(now)
+        key = (user_id, action)
+        tat = max(self._tat.get(key, now), now)
+        wait = tat - interval * (burst - 1) - now
+        if wait > 0:
+            return wait
+        self._tat[key] = tat + interval
+        self._tat.move_to_end(key)
+        return 0.0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None or user.id in self.exempt:
+            return await handler(event, data)
+
+        press = None
+        if isinstance(event, CallbackQuery):
+            press = (user.id, event.data or "")
+            now = time.monotonic()
+            if press in self._presses:
+                finished = self._presses[press]
+                if finished is None or now - finished < self.debounce:
+                    self.debounced += 1
+                    await event.answer()
+                    return None
+
+        wait = self.check(user.id, action_of(event))
+        if wait > 0:
+            self.throttled += 1
+            if isinstance(event, CallbackQuery):
+                await event.answer(f"⏳ Juda tez! {max(1, math.ceil(wait))} soniyadan keyin urinib ko‘ring.")
+            return None
+
+        self.allowed += 1
+        if press is None:
+            return await handler(event, data)
+        self._presses[press] = None
+        self._presses.move_to_end(press)
+        try:
+            return await handler(event, data)
+        finally:
+            self._presses[press] = time.monotonic()
+            self._presses.move_to_end(press)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "allowed": self.allowed,
+            "throttled": self.throttled,
+            "debounced": self.debounced,
+            "tracked_keys": len(self._tat),
+        }
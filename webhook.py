@@ -0,0 +1,131 @@
+# webhook.py
+"""
+Webhook entry mode (alternative to long polling).
+
+Telegram POSTs each update to an aiohttp endpoint. The handler only checks the
+secret token, validates the payload and puts the update into a bounded queue,
+so Telegram gets its 200 immediately. A fixed pool of workers feeds the queue
+into the dispatcher. When the queue is full the endpoint answers 503 and
+Telegram redelivers the update later, which keeps memory bounded under bursts.
+"""
+
+import asyncio
+import contextlib
+import hmac
+import logging
+import signal
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    def __init__(self, dp: Dispatcher, bot: Bot, path: str, secret: str, queue_size: int = 1000,
+                 workers: int = 8,
+                 extra_routes: Optional[Dict[str, Callable[[web.Request], Awaitable[web.Response]]]] = None):
+        self.dp = dp
+        self.bot = bot
+        self.path = path
+        self.secret = secret
+        self.workers = workers
+        self.extra_routes = extra_routes or {}  # extra GET endpoints on the same server (e.g. /metrics)
+        self._queue: "asyncio.Queue[Update]" = asyncio.Queue(maxsize=queue_size)
+        self._tasks: List[asyncio.Task] = []
+        self.received = 0
+        self.rejected = 0
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        for path, handler in self.extra_routes.items():
+            app.router.add_get(path, handler)
+        app.on_startup.append(self._on_startup)
+        app.on_shutdown.append(self._on_shutdown)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token, self.secret):
+            return web.Response(status=401)
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception:
+            logger.warning("Webhook: malformed update ignored")
+            return web.Response()  # 200, otherwise Telegram keeps redelivering it
+        try:
+            self._queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return web.Response(status=503)
+        self.received += 1
+        return web.Response()
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    async def _worker(self):
+        while True:
+            update = await self._queue.get()
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception:
+                logger.exception("Webhook: update %s failed", update.update_id)
+            finally:
+                self._queue.task_done()
+
+    async def _on_startup(self, app: web.Application):
+        await self.dp.emit_startup(bot=self.bot)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def _on_shutdown(self, app: web.Application):
+        # let already-acknowledged updates finish before stopping the workers
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=10)
+        except asyncio.TimeoutError:
+            logger.warning("Webhook: %d update(s) dropped on shutdown", self._queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.dp.emit_shutdown(bot=self.bot)
+
+
+async def run_webhook(server: WebhookServer, base_url: str, host: str, port: int,
+                      drop_pending_updates: bool = False):
+    """
+    Registers the webhook with Telegram and serves it until SIGTERM/SIGINT (or
+    cancellation). On a signal the listener closes first, then the updates
+    already acknowledged are drained and the dispatcher's shutdown hooks run.
+    """
+    runner = web.AppRunner(server.build_app())
+    await runner.setup()
+    site = web.TCPSite(runner, host=host, port=port)
+    await site.start()
+    url = base_url.rstrip("/") + server.path
+    await server.bot.set_webhook(
+        url,
+        secret_token=server.secret,
+        allowed_updates=server.dp.resolve_used_update_types(),
+        drop_pending_updates=drop_pending_updates,
+    )
+    logger.info("Webhook listening on %s:%s, registered at %s", host, port, url)
+    # like Dispatcher.start_polling: without this SIGTERM (every redeploy) kills the process outright
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    signals = (signal.SIGTERM, signal.SIGINT)
+    for sig in signals:
+        with contextlib.suppress(NotImplementedError):  # Windows
+            loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+        logger.info("Webhook: stop signal received, shutting down")
+    finally:
+        for sig in signals:
+            with contextlib.suppress(NotImplementedError):
+                loop.remove_signal_handler(sig)
+        await runner.cleanup()